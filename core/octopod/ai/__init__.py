@@ -1,19 +1,25 @@
-from typing import List
+from typing import List, Optional
 
-from pydub import AudioSegment  # type: ignore
+from octopod.audio import AudioSource
+from octopod.checkpoint import Checkpoints
+from octopod.ai.transcribe import transcribe_stream
+from octopod.ai.podclip import stream_podclips, stream_windows, Podclip
 
-from octopod.ai.transcribe import transcribe
-from octopod.ai.podclip import segments_to_podclips, Podclip
 
+async def extract_podclips(
+    source: AudioSource, checkpoints: Optional[Checkpoints] = None
+) -> List[Podclip]:
+    """Extract podclips from an audio file.
 
-def extract_podclips(source: AudioSegment) -> List[Podclip]:
-    """Extract podclips from an audio file."""
-    segments = transcribe(source)
-    return segments_to_podclips(segments)
+    Extraction starts on the first windows of the transcript while later chunks are still
+    being transcribed.
+    """
+    chunks = transcribe_stream(source, checkpoints)
+    return await stream_podclips(stream_windows(chunks), checkpoints)
 
 
 if __name__ == "__main__":
-    from pydub import AudioSegment
+    import asyncio
 
-    source = AudioSegment.from_file("../assets/big_ideas.mp3")
-    print(extract_podclips(source))
+    source = AudioSource.probe("../assets/big_ideas.mp3")
+    print(asyncio.run(extract_podclips(source)))
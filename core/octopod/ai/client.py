@@ -0,0 +1,62 @@
+import asyncio
+import functools
+import os
+import weakref
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from octopod.config import config
+
+
+def _limits() -> httpx.Limits:
+    """Enough kept-alive connections for every model at its full concurrency."""
+    connections = config.OPENAI_MAX_CONCURRENCY * len(config.OPENAI_RATE_LIMITS)
+    return httpx.Limits(
+        max_connections=connections,
+        max_keepalive_connections=connections,
+        keepalive_expiry=config.OPENAI_KEEPALIVE_SECONDS,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def openai_client() -> OpenAI:
+    """The OpenAI client of this process, shared by every thread.
+
+    Requests are made through `octopod.ai.limiter.limited`, so the client does not retry by
+    itself. The limiter retries within the rate limits of every worker and counts requests
+    towards the stage being measured.
+    """
+    return OpenAI(
+        api_key=config.OPENAI_API_KEY,
+        max_retries=0,
+        http_client=DefaultHttpxClient(limits=_limits()),
+    )
+
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]"
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def async_openai_client() -> AsyncOpenAI:
+    """The asynchronous counterpart of `openai_client`, shared by every task of the event loop.
+
+    Connections belong to the event loop they were opened in, so every loop has its own client.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = AsyncOpenAI(
+            api_key=config.OPENAI_API_KEY,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=_limits()),
+        )
+    return _async_clients[loop]
+
+
+def _clear_clients():
+    openai_client.cache_clear()
+    _async_clients.clear()
+
+
+# Connections must not be shared with a forked rq work horse.
+os.register_at_fork(after_in_child=_clear_clients)
@@ -0,0 +1,66 @@
+"""Batched embeddings.
+
+Texts are embedded in as few requests as the limits of the API allow, rather than one request
+per text, and the requests of a batch run concurrently within the rate limits of the model.
+Embeddings of texts which were embedded before come from the response cache instead.
+"""
+
+import asyncio
+from typing import List, Sequence
+
+from octopod.ai.client import async_openai_client
+from octopod.ai.limiter import estimate_tokens, limited_async
+from octopod.ai.responses import cache_embeddings, cached_embeddings
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536  # Of the embedding column of podclips
+# Limits of a single request, with some room for the estimate of the tokens being low.
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 200_000
+MAX_INPUT_TOKENS = 8191
+
+
+def batches(texts: Sequence[str]) -> List[range]:
+    """Split texts into consecutive batches which each fit a single request."""
+    result: List[range] = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        text_tokens = min(estimate_tokens(text), MAX_INPUT_TOKENS)
+        if i > start and (
+            i - start == MAX_BATCH_INPUTS or tokens + text_tokens > MAX_BATCH_TOKENS
+        ):
+            result.append(range(start, i))
+            start, tokens = i, 0
+        tokens += text_tokens
+    if start < len(texts):
+        result.append(range(start, len(texts)))
+    return result
+
+
+async def _embed_batch(texts: Sequence[str]) -> List[List[float]]:
+    client = async_openai_client()
+    response = await limited_async(
+        client.embeddings.with_raw_response.create,
+        tokens=sum(estimate_tokens(text) for text in texts),
+        model=EMBEDDING_MODEL,
+        dimensions=EMBEDDING_DIMENSIONS,
+        input=list(texts),
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda x: x.index)]
+
+
+async def embed(texts: Sequence[str]) -> List[List[float]]:
+    """Embed texts, in order."""
+    embeddings = await asyncio.to_thread(
+        cached_embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, texts
+    )
+    missing = [text for text, embedding in zip(texts, embeddings) if embedding is None]
+    results = await asyncio.gather(
+        *(_embed_batch(missing[batch.start : batch.stop]) for batch in batches(missing))
+    )
+    embedded = [embedding for result in results for embedding in result]
+    await asyncio.to_thread(
+        cache_embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, missing, embedded
+    )
+    new = iter(embedded)
+    return [next(new) if embedding is None else embedding for embedding in embeddings]
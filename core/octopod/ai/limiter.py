@@ -0,0 +1,306 @@
+"""Rate limiting of OpenAI requests across every worker.
+
+Every request first takes a request, and an estimate of its tokens, from token buckets per model
+which are shared through Redis, so the workers together stay within the limits of the account.
+Within a worker, the requests in flight per model adapt to the rate limit headers of the
+responses: they grow by one per round of successful requests and halve whenever a limit is
+nearly used up or hit. Rate limited and failed requests are retried with jittered exponential
+backoff.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+
+import httpx
+import openai
+
+from octopod.config import config
+from octopod.metrics import count
+from octopod.queue import redis
+
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+# Requests in flight are halved when less than this fraction of a limit remains.
+LOW_REMAINING = 0.1
+
+# Takes a request and ARGV[3] tokens from the buckets of a model unless either bucket runs short,
+# in which case nothing is taken and the seconds until both would suffice are returned instead.
+# Buckets hold up to a minute's worth and refill continuously. Limits of 0 are not enforced.
+TAKE = redis.register_script(
+    """
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1e6
+    local wait = 0
+    local levels = {}
+    local wants = {}
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i])
+        if rate > 0 then
+            local want = 1
+            if i == 2 then want = math.min(tonumber(ARGV[3]), rate) end
+            local state = redis.call("HMGET", key, "level", "at")
+            local level = tonumber(state[1]) or rate
+            local at = tonumber(state[2]) or now
+            level = math.min(rate, level + math.max(0, now - at) * rate / 60)
+            if level < want then
+                wait = math.max(wait, (want - level) * 60 / rate)
+            end
+            levels[i] = level
+            wants[i] = want
+        end
+    end
+    if wait > 0 then
+        return tostring(wait)
+    end
+    for i, key in ipairs(KEYS) do
+        if levels[i] then
+            redis.call("HSET", key, "level", levels[i] - wants[i], "at", now)
+            redis.call("EXPIRE", key, 120)
+        end
+    end
+    return "0"
+    """
+)
+
+
+def _try_take(model: str, tokens: int) -> float:
+    """Take a request and `tokens` tokens of the model's rate limits, or return the seconds
+    until they would suffice without taking anything."""
+    limits = config.OPENAI_RATE_LIMITS.get(model)
+    if limits is None:
+        return 0.0
+    requests_per_minute, tokens_per_minute = limits
+    return float(
+        TAKE(
+            keys=[
+                f"octopod:ratelimit:{model}:requests",
+                f"octopod:ratelimit:{model}:tokens",
+            ],
+            args=[requests_per_minute, tokens_per_minute, tokens],
+        )
+    )
+
+
+def _jitter(wait: float) -> float:
+    return wait + random.uniform(0, wait)
+
+
+def take(model: str, tokens: int = 0):
+    """Wait for a request and `tokens` tokens of the model's rate limits."""
+    while (wait := _try_take(model, tokens)) > 0:
+        time.sleep(_jitter(wait))
+
+
+async def take_async(model: str, tokens: int = 0):
+    """`take` for the tasks of an event loop, which wait on the loop rather than in threads."""
+    if model not in config.OPENAI_RATE_LIMITS:
+        return
+    while (wait := await asyncio.to_thread(_try_take, model, tokens)) > 0:
+        await asyncio.sleep(_jitter(wait))
+
+
+class AdaptiveLimit:
+    """A limit on requests in flight which grows additively and shrinks multiplicatively."""
+
+    def __init__(self, limit: float, max_limit: int):
+        self.limit = limit
+        self.max_limit = max_limit
+        self.active = 0
+
+    def admits(self) -> bool:
+        return self.active < int(self.limit)
+
+    def increase(self):
+        """One more request in flight for every limit's worth of successful requests."""
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def decrease(self):
+        self.limit = max(1.0, self.limit / 2)
+
+
+class AdaptiveConcurrency(AdaptiveLimit):
+    """An adaptive limit shared by threads."""
+
+    def __init__(self, limit: float, max_limit: int):
+        super().__init__(limit, max_limit)
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(self.admits)
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify_all()
+
+    def increase(self):
+        with self._condition:
+            super().increase()
+            self._condition.notify_all()
+
+    def decrease(self):
+        with self._condition:
+            super().decrease()
+
+
+class AsyncAdaptiveConcurrency(AdaptiveLimit):
+    """An adaptive limit shared by the tasks of an event loop."""
+
+    def __init__(self, limit: float, max_limit: int):
+        super().__init__(limit, max_limit)
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._condition:
+            await self._condition.wait_for(self.admits)
+            self.active += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.active -= 1
+                self._condition.notify_all()
+
+
+_concurrency: Dict[str, AdaptiveConcurrency] = {}
+_concurrency_lock = threading.Lock()
+_LoopConcurrency = Dict[str, AsyncAdaptiveConcurrency]
+_async_concurrency: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopConcurrency]"
+)
+_async_concurrency = weakref.WeakKeyDictionary()
+
+
+def concurrency(model: str) -> AdaptiveConcurrency:
+    """The requests in flight to a model from the threads of this worker."""
+    with _concurrency_lock:
+        if model not in _concurrency:
+            _concurrency[model] = AdaptiveConcurrency(
+                config.OPENAI_INITIAL_CONCURRENCY, config.OPENAI_MAX_CONCURRENCY
+            )
+        return _concurrency[model]
+
+
+def async_concurrency(model: str) -> AsyncAdaptiveConcurrency:
+    """The requests in flight to a model from the running event loop.
+
+    This is the global limit on concurrent requests of every task in the loop.
+    """
+    limits = _async_concurrency.setdefault(asyncio.get_running_loop(), {})
+    if model not in limits:
+        limits[model] = AsyncAdaptiveConcurrency(
+            config.OPENAI_INITIAL_CONCURRENCY, config.OPENAI_MAX_CONCURRENCY
+        )
+    return limits[model]
+
+
+def _nearly_limited(headers: httpx.Headers) -> bool:
+    for resource in ("requests", "tokens"):
+        limit = headers.get(f"x-ratelimit-limit-{resource}")
+        remaining = headers.get(f"x-ratelimit-remaining-{resource}")
+        if limit and remaining and int(remaining) < LOW_REMAINING * int(limit):
+            return True
+    return False
+
+
+def _retry_after(error: openai.APIError) -> Optional[float]:
+    if not isinstance(error, openai.APIStatusError):
+        return None
+    try:
+        return float(error.response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+def backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before the `attempt`-th retry, with full jitter."""
+    ceiling = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2**attempt)
+    return max(retry_after or 0.0, random.uniform(0, ceiling))
+
+
+RETRIED = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def _adapt(slots: AdaptiveLimit, headers: httpx.Headers):
+    if _nearly_limited(headers):
+        slots.decrease()
+    else:
+        slots.increase()
+
+
+def _retry_delay(
+    slots: AdaptiveLimit, error: openai.APIError, attempt: int, model: str
+) -> float:
+    """Seconds to wait before retrying a failed request, which is raised if out of retries."""
+    if isinstance(error, openai.RateLimitError):
+        slots.decrease()
+    if attempt >= config.OPENAI_MAX_RETRIES:
+        raise error
+    delay = backoff(attempt, _retry_after(error))
+    print(f"Retrying {model} request in {delay:.1f}s after {error!r}")
+    return delay
+
+
+def limited(create: Callable[..., Any], tokens: int = 0, **kwargs) -> Any:
+    """Make an OpenAI request within the rate limits of its model, retrying if it fails.
+
+    `create` is the `with_raw_response` variant of an endpoint, such as
+    `client.chat.completions.with_raw_response.create`, so that the rate limit headers of the
+    response can be read. The parsed response is returned.
+    """
+    model = kwargs["model"]
+    slots = concurrency(model)
+    attempt = 0
+    while True:
+        count(**{"api_retries" if attempt else "api_calls": 1})
+        try:
+            with slots.slot():
+                # Only requests about to be sent draw from the limits every worker shares.
+                take(model, tokens)
+                response = create(**kwargs)
+                _adapt(slots, response.headers)
+        except RETRIED as e:
+            time.sleep(_retry_delay(slots, e, attempt, model))
+            attempt += 1
+            continue
+        return response.parse()
+
+
+async def limited_async(
+    create: Callable[..., Awaitable[Any]], tokens: int = 0, **kwargs
+) -> Any:
+    """`limited` for a request of the `async_openai_client`."""
+    model = kwargs["model"]
+    slots = async_concurrency(model)
+    attempt = 0
+    while True:
+        count(**{"api_retries" if attempt else "api_calls": 1})
+        try:
+            async with slots.slot():
+                await take_async(model, tokens)
+                response = await create(**kwargs)
+                _adapt(slots, response.headers)
+        except RETRIED as e:
+            await asyncio.sleep(_retry_delay(slots, e, attempt, model))
+            attempt += 1
+            continue
+        return response.parse()
+
+
+def estimate_tokens(text: str) -> int:
+    """A rough count of the tokens of English text, about four characters each."""
+    return len(text) // 4 + 1
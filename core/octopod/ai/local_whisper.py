@@ -0,0 +1,67 @@
+"""Whisper on the CPUs of the worker, with faster-whisper.
+
+Quantized to int8, a small model transcribes an hour of speech in minutes on a many-core box,
+with no per-minute cost and nothing to upload. The model is downloaded to CACHE_DIR once.
+"""
+
+import concurrent.futures
+import functools
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from octopod.ai.transcribe import Chunk, TranscriptionBackend
+from octopod.ai.transcript import Segment
+from octopod.audio import SPEECH_RATE, AudioSource
+from octopod.config import config
+
+
+@functools.lru_cache(maxsize=None)
+def whisper_model():
+    """The model of this process, shared by LOCAL_WHISPER_WORKERS threads.
+
+    Each worker runs on its own share of the CPUs, so chunks are transcribed in parallel
+    rather than one after the other on every core.
+    """
+    from faster_whisper import WhisperModel  # type: ignore
+
+    workers = config.LOCAL_WHISPER_WORKERS
+    return WhisperModel(
+        config.LOCAL_WHISPER_MODEL,
+        device="cpu",
+        compute_type=config.LOCAL_WHISPER_COMPUTE_TYPE,
+        cpu_threads=max(1, (os.cpu_count() or 1) // workers),
+        num_workers=workers,
+        download_root=os.path.join(config.CACHE_DIR, "whisper"),
+    )
+
+
+def _transcribe(source: AudioSource, chunk: Chunk) -> List[Segment]:
+    start, end = chunk
+    samples = source.samples(start, end - start, SPEECH_RATE)
+    audio = samples.astype(np.float32) / 32768
+    segments, _ = whisper_model().transcribe(audio, beam_size=5)
+    return [
+        Segment(
+            start_time=segment.start + start,
+            end_time=segment.end + start,
+            text=segment.text,
+        )
+        for segment in segments
+    ]
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    def transcribe(
+        self, source: AudioSource, chunks: Dict[int, Chunk]
+    ) -> Iterator[Tuple[int, List[Segment]]]:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=config.LOCAL_WHISPER_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(_transcribe, source, chunk): i
+                for i, chunk in chunks.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                yield futures[future], future.result()
@@ -1,23 +1,30 @@
-from typing import List, Optional
-from dataclasses import dataclass
-import tempfile
+import asyncio
+import json
+from typing import Iterable, Iterator, List, Optional, Tuple
+from dataclasses import asdict, dataclass
+from io import BytesIO
 
 from sqlalchemy import select
 from uuid import UUID
 
-import concurrent.futures
 
 import dirtyjson  # type: ignore
-from openai import OpenAI
+import numpy as np
 from pydub import AudioSegment  # type: ignore
 from mako.template import Template  # type: ignore
 
+from octopod.ai.embeddings import embed
+from octopod.ai.limiter import estimate_tokens
+from octopod.ai.responses import complete
+from octopod.checkpoint import Checkpoints
+from octopod.ai.speech import synthesize
+from octopod.ai.transcript import Transcript
 from octopod.config import config
-from octopod.ai.transcribe import Segment
 from octopod.database import SessionLocal
 from octopod.models import Podcast, Creator
 
-MAX_WORKERS = 4
+# Allowance for the completion of a chat request, on top of its prompt.
+COMPLETION_TOKENS = 500
 
 MIN_PODCLIP_SECONDS = 60
 
@@ -28,6 +35,36 @@ class Topic:
     description: str
 
 
+def _parse_topics(content: str) -> List[Topic]:
+    try:
+        topics = dirtyjson.loads(content)["topics"]
+        return [Topic(str(x["title"]), str(x["description"])) for x in topics]
+    except Exception:
+        print(content)
+        raise ValueError("Failed to parse topics from response")
+
+
+def _parse_indices(content: str) -> Tuple[int, int]:
+    try:
+        indices = dirtyjson.loads(content)
+        return int(indices["start"]), int(indices["end"])
+    except Exception:
+        print(content)
+        raise ValueError("Failed to parse indices from response")
+
+
+def _parse_podclips(content: str) -> List[Tuple[Topic, int, int]]:
+    try:
+        podclips = json.loads(content)["podclips"]
+        return [
+            (Topic(x["title"], x["description"]), int(x["start"]), int(x["end"]))
+            for x in podclips
+        ]
+    except Exception:
+        print(content)
+        raise ValueError("Failed to parse podclips from response")
+
+
 @dataclass
 class Podclip:
     title: str
@@ -96,24 +133,76 @@ Response:
 """
 )
 
+PODCLIPS_PROMPT = Template(
+    """
+Here is a partial transcript of a podcast, with numbered lines:
+                         
+```
+${transcript}
+```
+                         
+Lines ${first} to ${last} are the part of the transcript to find topics in, the lines before
+and after them are context. Find the interesting topics which were discussed in detail in these
+lines and not just mentioned in passing. Ensure that the topics are distinct and do not overlap
+with each other.
+
+For every topic, give a short title, a longer description containing several sentences, and the
+starting and ending line numbers of the passage most relevant to it. The passage should be a
+contiguous range of lines from the whole transcript and may include some context before and
+after the relevant lines so that it makes sense to the reader when read in isolation.
+"""
+)
+
+# Structured output of PODCLIPS_PROMPT, which the model is constrained to.
+PODCLIPS_SCHEMA = {
+    "name": "podclips",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "podclips": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string"},
+                        "description": {"type": "string"},
+                        "start": {"type": "integer"},
+                        "end": {"type": "integer"},
+                    },
+                    "required": ["title", "description", "start", "end"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["podclips"],
+        "additionalProperties": False,
+    },
+}
+
 
 @dataclass
 class Window:
-    segments: List[Segment]
-    pre_context: List[Segment]
-    post_context: List[Segment]
+    """Lines of a transcript with their context before and after, as views of the transcript."""
+
+    context: Transcript
+    first: int  # The lines of the window within `context`
+    last: int
+
+    @property
+    def lines(self) -> Transcript:
+        return self.context[self.first : self.last]
 
     def text(self, context: bool = False) -> str:
         if context:
-            return " ".join(
-                x.text for x in self.pre_context + self.segments + self.post_context
-            )
-        return " ".join(x.text for x in self.segments)
+            return self.context.joined()
+        return self.lines.joined()
 
-    def topics(self) -> List[Topic]:
-        client = OpenAI(api_key=config.OPENAI_API_KEY)
+    async def topics(self) -> List[Topic]:
         prompt = TOPICS_PROMPT.render(transcript=self.text())
-        response = client.chat.completions.create(
+        return await complete(
+            _parse_topics,
+            tokens=estimate_tokens(prompt) + COMPLETION_TOKENS,
             model="gpt-4o-mini",
             response_format={"type": "json_object"},
             messages=[
@@ -127,30 +216,20 @@ class Window:
                 },
             ],
         )
-        try:
-            response = dirtyjson.loads(response.choices[0].message.content)["topics"]
-        except Exception:
-            print(response.choices[0].message.content)
-            raise ValueError("Failed to parse topics from response")
-        return [Topic(x["title"], x["description"]) for x in response]  # type: ignore
-
-    def podclip(self, topic: Topic) -> Optional[Podclip]:
-        client = OpenAI(api_key=config.OPENAI_API_KEY)
-
-        lines = []
-        for segment in self.pre_context + self.segments + self.post_context:
-            lines.append(segment)
 
-        numbered_transcript = ""
-        for i, line in enumerate(lines):
-            numbered_transcript += f"{i}: {line.text}\n"
+    def numbered(self) -> str:
+        """The lines of the window and its context, numbered from the first line of context."""
+        return "".join(f"{i}: {line}\n" for i, line in enumerate(self.context.lines()))
 
+    async def podclip(self, topic: Topic) -> Optional[Podclip]:
         prompt = EXCERPT_PROMPT.render(
-            transcript=numbered_transcript,
+            transcript=self.numbered(),
             topic_title=topic.title,
             topic_description=topic.description,
         )
-        response = client.chat.completions.create(
+        start, end = await complete(
+            _parse_indices,
+            tokens=estimate_tokens(prompt) + COMPLETION_TOKENS,
             model="gpt-4o-mini",
             response_format={"type": "json_object"},
             messages=[
@@ -164,71 +243,242 @@ class Window:
                 },
             ],
         )
-        try:
-            indices = dirtyjson.loads(response.choices[0].message.content)
-        except Exception:
-            print(response.choices[0].message.content)
-            raise ValueError("Failed to parse indices from response")
+        return self.excerpt(topic, start, end)
+
+    async def podclips(self) -> List[Optional[Podclip]]:
+        """Topics and their excerpts in a single request, rather than one per topic."""
+        prompt = PODCLIPS_PROMPT.render(
+            transcript=self.numbered(), first=self.first, last=self.last - 1
+        )
+        podclips = await complete(
+            _parse_podclips,
+            tokens=estimate_tokens(prompt) + COMPLETION_TOKENS,
+            model="gpt-4o-mini",
+            response_format={"type": "json_schema", "json_schema": PODCLIPS_SCHEMA},
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Your task is to find the interesting topics discussed in the podcast and the passages about them.",
+                },
+                {
+                    "role": "user",
+                    "content": prompt,
+                },
+            ],
+        )
+        return [self.excerpt(topic, start, end) for topic, start, end in podclips]
 
-        start, end = indices["start"], indices["end"]
+    def excerpt(self, topic: Topic, start: int, end: int) -> Optional[Podclip]:
+        """The podclip of a topic from line `start` to `end` of the numbered context."""
+        lines = self.context
         try:
-            start_ts, end_ts = lines[start].start_time, lines[end].end_time
+            start_ts, end_ts = float(lines.starts[start]), float(lines.ends[end])
         except IndexError:
-            print(indices)
+            print(f"Lines {start} to {end} are out of range")
             return None
 
-        embed = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=topic.description,
-        )
-
         return Podclip(
             title=topic.title,
             description=topic.description,
             start_time=start_ts,
             end_time=end_ts,
-            text=" ".join(x.text for x in lines[start:end]),
-            embedding=embed.data[0].embedding,
+            text=lines[start:end].joined(),
+            embedding=[],  # Filled in for all podclips at once by `embed_podclips`
         )
 
 
-def segments_to_windows(
-    segments: List[Segment], window_size: int = 100, context_size: int = 25
+def stream_windows(
+    chunks: Iterable[Transcript], window_size: int = 100, context_size: int = 25
+) -> Iterator[Window]:
+    """Windows of a transcript which arrives in chunks, as soon as their context is complete.
+
+    The windows are the same as those of `transcript_to_windows` on the whole transcript.
+    """
+    transcript = Transcript.concat([])
+    i = 0
+    for chunk in chunks:
+        transcript = Transcript.concat([transcript, chunk])
+        while i + window_size + context_size <= len(transcript):
+            yield _window(transcript, i, window_size, context_size)
+            i += window_size
+    while i < len(transcript):
+        yield _window(transcript, i, window_size, context_size)
+        i += window_size
+
+
+def _window(
+    transcript: Transcript, i: int, window_size: int, context_size: int
+) -> Window:
+    first = max(0, i - context_size)
+    context = transcript[first : i + window_size + context_size]
+    return Window(context, i - first, min(len(context), i - first + window_size))
+
+
+def complete_windows(
+    lines: int, finished: bool, window_size: int = 100, context_size: int = 25
+) -> int:
+    """How many windows `stream_windows` yields once the first `lines` lines of a transcript
+    arrived, and whether those are all of its lines."""
+    if finished:
+        return -(-lines // window_size)
+    return max(0, (lines - context_size) // window_size)
+
+
+def window_lines(index: int, window_size: int = 100, context_size: int = 25) -> range:
+    """The lines of the transcript in the `index`-th window and its context."""
+    start = index * window_size
+    return range(max(0, start - context_size), start + window_size + context_size)
+
+
+def window_at(
+    part: Transcript,
+    index: int,
+    start: int,
+    window_size: int = 100,
+    context_size: int = 25,
+) -> Window:
+    """The `index`-th window, from the part of a transcript from its line `start` on, which
+    holds at least the lines of the window and its context."""
+    return _window(part, index * window_size - start, window_size, context_size)
+
+
+def transcript_to_windows(
+    transcript: Transcript, window_size: int = 100, context_size: int = 25
 ) -> List[Window]:
-    windows = []
-    for i in range(0, len(segments), window_size):
-        window = segments[i : i + window_size]
-        pre_context = segments[max(0, i - context_size) : i]
-        post_context = segments[i + window_size : i + window_size + context_size]
-        windows.append(Window(window, pre_context, post_context))
-    return windows
+    return list(stream_windows([transcript], window_size, context_size))
+
+
+async def _topics(
+    window: Window, index: int, checkpoints: Optional[Checkpoints]
+) -> List[Topic]:
+    if checkpoints is None:
+        return await window.topics()
+    saved = await asyncio.to_thread(checkpoints.load, f"topics/{index}")
+    if saved is not None:
+        return [Topic(**topic) for topic in saved]
+    topics = await window.topics()
+    await asyncio.to_thread(
+        checkpoints.save, f"topics/{index}", [asdict(topic) for topic in topics]
+    )
+    return topics
+
 
+async def _candidates(
+    window: Window, index: int, checkpoints: Optional[Checkpoints]
+) -> List[Optional[Podclip]]:
+    if config.EXTRACTION_MODE == "single_call":
+        return await window.podclips()
+    topics = await _topics(window, index, checkpoints)
+    return await asyncio.gather(*(window.podclip(topic) for topic in topics))
+
+
+async def window_podclips(
+    window: Window, index: int, checkpoints: Optional[Checkpoints] = None
+) -> List[Podclip]:
+    """Extract the podclips of the `index`-th window of a transcript.
+
+    In the "two_phase" EXTRACTION_MODE, the topics of the window are requested first and then
+    the excerpts of all of them at the same time. In "single_call" mode, a single request
+    returns both.
+    """
+    if checkpoints is not None:
+        saved = await asyncio.to_thread(checkpoints.load, f"podclips/{index}")
+        if saved is not None:
+            return [Podclip(**podclip) for podclip in saved]
 
-def _podclips(window: Window) -> List[Podclip]:
     podclips = []
-    for topic in window.topics():
-        podclip = window.podclip(topic)
+    for podclip in await _candidates(window, index, checkpoints):
         if (
             podclip is not None
             and podclip.end_time - podclip.start_time > MIN_PODCLIP_SECONDS
         ):
             print(
-                f"Found podclip: {topic.title} ({podclip.start_time} -> {podclip.end_time})"
+                f"Found podclip: {podclip.title} ({podclip.start_time} -> {podclip.end_time})"
             )
             podclips.append(podclip)
+
+    if checkpoints is not None:
+        await asyncio.to_thread(
+            checkpoints.save,
+            f"podclips/{index}",
+            [asdict(podclip) for podclip in podclips],
+        )
     return podclips
 
 
-def segments_to_podclips(segments: List[Segment]) -> List[Podclip]:
-    windows = segments_to_windows(segments)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        results = list(executor.map(_podclips, windows))
-    return [podclip for result in results for podclip in result]
+async def stream_podclips(
+    windows: Iterable[Window], checkpoints: Optional[Checkpoints] = None
+) -> List[Podclip]:
+    """Extract the podclips of windows as they arrive, while later windows are still coming.
+
+    Every window is extracted in a task of its own. How many requests are in flight at once is
+    up to the limiter, across every window and topic.
+    """
+    iterator = iter(windows)
+    tasks: List["asyncio.Task[List[Podclip]]"] = []
+    while (window := await asyncio.to_thread(next, iterator, None)) is not None:
+        tasks.append(
+            asyncio.create_task(window_podclips(window, len(tasks), checkpoints))
+        )
+    results = await asyncio.gather(*tasks)
+    podclips = [podclip for result in results for podclip in result]
+    return dedup_podclips(await embed_podclips(podclips))
+
 
+async def embed_podclips(podclips: List[Podclip]) -> List[Podclip]:
+    """Embed the descriptions of the podclips which lack an embedding, in batches."""
+    missing = [podclip for podclip in podclips if not podclip.embedding]
+    embeddings = await embed([podclip.description for podclip in missing])
+    for podclip, embedding in zip(missing, embeddings):
+        podclip.embedding = embedding
+    return podclips
 
-async def podclip_intro(clip: Podclip, podcast_uuid: UUID) -> AudioSegment:
-    """Creates an intro for a podclip"""
-    print(f"Looking up podclip information for {clip.title}")
+
+def duplicates(podclips: List[Podclip]) -> np.ndarray:
+    """Which pairs of embedded podclips are the same podclip, as a symmetric boolean matrix."""
+    embeddings = np.array([podclip.embedding for podclip in podclips], dtype=np.float64)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms == 0, 1, norms)
+    similarity = unit @ unit.T
+
+    starts = np.array([podclip.start_time for podclip in podclips])
+    ends = np.array([podclip.end_time for podclip in podclips])
+    intersection = np.minimum.outer(ends, ends) - np.maximum.outer(starts, starts)
+    union = np.maximum.outer(ends, ends) - np.minimum.outer(starts, starts)
+    overlap = np.clip(intersection, 0, None) / np.where(union > 0, union, 1)
+
+    return (similarity >= config.DEDUP_MIN_SIMILARITY) & (
+        overlap >= config.DEDUP_MIN_OVERLAP
+    )
+
+
+def dedup_podclips(podclips: List[Podclip]) -> List[Podclip]:
+    """Drop podclips which duplicate a longer one, such as the same topic found by two
+    overlapping windows. The kept podclips stay in order."""
+    if len(podclips) < 2:
+        return podclips
+    same = duplicates(podclips)
+    durations = np.array([p.end_time - p.start_time for p in podclips])
+    dropped = np.zeros(len(podclips), dtype=bool)
+    # Longest first, and the earliest of equally long podclips.
+    for i in np.argsort(-durations, kind="stable"):
+        if not dropped[i]:
+            dropped |= same[i]
+            dropped[i] = False
+    kept = [podclip for podclip, drop in zip(podclips, dropped) if not drop]
+    if len(kept) < len(podclips):
+        print(f"Dropped {len(podclips) - len(kept)} duplicate podclips")
+    return kept
+
+
+async def transcript_to_podclips(
+    transcript: Transcript, checkpoints: Optional[Checkpoints] = None
+) -> List[Podclip]:
+    return await stream_podclips(transcript_to_windows(transcript), checkpoints)
+
+
+async def get_creator_name(podcast_uuid: UUID) -> str:
+    """Looks up the name of the creator of a podcast"""
     async with SessionLocal() as session:
         result = await session.execute(
             select(Creator.name)
@@ -238,18 +488,15 @@ async def podclip_intro(clip: Podclip, podcast_uuid: UUID) -> AudioSegment:
         creator = result.scalar()
         if not creator:
             raise ValueError(f"Creator for podcast {podcast_uuid} not found")
+    return creator
 
-    print("Generating intro for podclip")
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
-    intro = f"From {creator}, on {clip.title}"
 
-    response = client.audio.speech.create(
-        model="tts-1",
-        voice="nova",
-        input=intro,
-    )
+def title_intro(title: str, creator: str) -> AudioSegment:
+    """Creates the spoken intro for a podclip with the given title"""
+    intro = f"From {creator}, on {title}"
+    return AudioSegment.from_file(BytesIO(synthesize(intro)), format="mp3")
 
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-        response.stream_to_file(temp_file.name)
 
-        return AudioSegment.from_file(temp_file.name)
+def podclip_intro(clip: Podclip, creator: str) -> AudioSegment:
+    """Creates an intro for a podclip"""
+    return title_intro(clip.title, creator)
@@ -0,0 +1,212 @@
+"""Cached responses of chat and embedding requests.
+
+Responses are cached by their request, so reprocessing an episode, or running the same
+extraction again, does not pay for the same completions and embeddings twice and gets the same
+answers. The cache is either on the disk of the worker or in Redis, where every worker shares
+it, as selected by LLM_CACHE_BACKEND. Entries expire after LLM_CACHE_TTL and the least recently
+used ones are evicted once the cache is full. Hits and misses count towards the stage being
+measured. The cache is an optimization only: when it cannot be read or written, the request
+is made and its response returned as if nothing was cached.
+"""
+
+import asyncio
+import json
+import struct
+import time
+from hashlib import sha256
+from typing import Any, Callable, List, Optional, Protocol, Sequence, TypeVar
+
+from openai.types.chat import ChatCompletion
+from redis import RedisError
+
+from octopod.ai.client import async_openai_client
+from octopod.ai.limiter import limited_async
+from octopod.cache import DiskCache
+from octopod.config import config
+from octopod.metrics import count
+from octopod.queue import redis
+
+REDIS_PREFIX = "octopod:llm:"
+
+# Caches ARGV[1] for ARGV[2] seconds and marks it as used, then evicts the least recently used
+# entries beyond ARGV[3]. Entries which were last used longer ago than the TTL have expired.
+PUT = redis.register_script(
+    """
+    local now = tonumber(redis.call("TIME")[1])
+    redis.call("SET", KEYS[2], ARGV[1], "EX", ARGV[2])
+    redis.call("ZADD", KEYS[1], now, KEYS[2])
+    redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - tonumber(ARGV[2]))
+    local excess = redis.call("ZCARD", KEYS[1]) - tonumber(ARGV[3])
+    if excess > 0 then
+        local evicted = redis.call("ZPOPMIN", KEYS[1], excess)
+        for i = 1, #evicted, 2 do
+            redis.call("DEL", evicted[i])
+        end
+    end
+    """
+)
+
+# The cached entry, which is marked as used, or nil on a miss.
+GET = redis.register_script(
+    """
+    local value = redis.call("GET", KEYS[2])
+    if value then
+        redis.call("ZADD", KEYS[1], tonumber(redis.call("TIME")[1]), KEYS[2])
+    end
+    return value
+    """
+)
+
+# Prefix of every entry on disk: when it expires, in seconds since the epoch.
+EXPIRES = struct.Struct("<d")
+
+# Shared by every DiskResponseCache of the process, which evicts once enough was written to it.
+disk_cache = DiskCache("responses", config.LLM_CACHE_BYTES)
+
+
+class ResponseCache(Protocol):
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def put(self, key: str, data: bytes): ...
+
+
+class DiskResponseCache:
+    """Responses in a `DiskCache` of the worker, within LLM_CACHE_BYTES."""
+
+    def __init__(self):
+        self.cache = disk_cache
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.cache.read(key)
+        if data is None or len(data) < EXPIRES.size:
+            return None
+        (expires,) = EXPIRES.unpack_from(data)
+        if expires < time.time():
+            return None
+        return data[EXPIRES.size :]
+
+    def put(self, key: str, data: bytes):
+        self.cache.put(key, EXPIRES.pack(time.time() + config.LLM_CACHE_TTL) + data)
+
+
+class RedisResponseCache:
+    """Responses in Redis, shared by every worker, up to LLM_CACHE_ENTRIES of them."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return GET(keys=[REDIS_PREFIX + "used", REDIS_PREFIX + key])
+
+    def put(self, key: str, data: bytes):
+        PUT(
+            keys=[REDIS_PREFIX + "used", REDIS_PREFIX + key],
+            args=[data, config.LLM_CACHE_TTL, config.LLM_CACHE_ENTRIES],
+        )
+
+
+def response_cache() -> Optional[ResponseCache]:
+    """The response cache selected by LLM_CACHE_BACKEND, or None if responses are not cached."""
+    if config.LLM_CACHE_BACKEND == "disk":
+        return DiskResponseCache()
+    if config.LLM_CACHE_BACKEND == "redis":
+        return RedisResponseCache()
+    return None
+
+
+# Errors of either backend, which must never fail the request.
+CACHE_ERRORS = (OSError, RedisError)
+
+
+def _get(cache: ResponseCache, key: str) -> Optional[bytes]:
+    try:
+        return cache.get(key)
+    except CACHE_ERRORS as e:
+        print(f"Failed to read cached response {key}: {e!r}")
+        return None
+
+
+def _put(cache: ResponseCache, key: str, data: bytes):
+    try:
+        cache.put(key, data)
+    except CACHE_ERRORS as e:
+        print(f"Failed to cache response {key}: {e!r}")
+
+
+def request_key(kind: str, **request: Any) -> str:
+    """Content address of a request, such as its model, messages and response format."""
+    return sha256(json.dumps([kind, request], sort_keys=True).encode()).hexdigest()
+
+
+T = TypeVar("T")
+
+
+async def complete(parse: Callable[[str], T], tokens: int = 0, **request: Any) -> T:
+    """The content of a chat completion of the request, as parsed by `parse`. The request is only
+    made if no completion of it is cached yet.
+
+    `parse` raises ValueError for a malformed completion, which is raised in turn. Only
+    completions which were parsed, and which stopped by themselves rather than being cut off by
+    their length, are cached, so a malformed completion is requested again next time.
+    """
+    cache = response_cache()
+    key = request_key("chat", **request)
+    if cache is not None:
+        data = await asyncio.to_thread(_get, cache, key)
+        if data is not None:
+            try:
+                result = parse(_content(ChatCompletion.model_validate_json(data)))
+            except ValueError as e:
+                print(f"Ignoring cached response {key}: {e!r}")
+            else:
+                count(cache_hits=1)
+                return result
+        count(cache_misses=1)
+
+    client = async_openai_client()
+    response = await limited_async(
+        client.chat.completions.with_raw_response.create, tokens=tokens, **request
+    )
+    result = parse(_content(response))
+    if cache is not None and response.choices[0].finish_reason == "stop":
+        await asyncio.to_thread(_put, cache, key, response.model_dump_json().encode())
+    return result
+
+
+def _content(response: ChatCompletion) -> str:
+    return response.choices[0].message.content or ""
+
+
+def _embedding_keys(model: str, dimensions: int, texts: Sequence[str]) -> List[str]:
+    return [
+        request_key("embedding", model=model, dimensions=dimensions, input=text)
+        for text in texts
+    ]
+
+
+def cached_embeddings(
+    model: str, dimensions: int, texts: Sequence[str]
+) -> List[Optional[List[float]]]:
+    """The cached embedding of every text, or None for those which are not cached."""
+    cache = response_cache()
+    if cache is None:
+        return [None] * len(texts)
+    embeddings: List[Optional[List[float]]] = []
+    for key in _embedding_keys(model, dimensions, texts):
+        data = _get(cache, key)
+        embeddings.append(
+            None if data is None else list(struct.unpack(f"<{len(data) // 8}d", data))
+        )
+    hits = sum(embedding is not None for embedding in embeddings)
+    count(cache_hits=hits, cache_misses=len(texts) - hits)
+    return embeddings
+
+
+def cache_embeddings(
+    model: str,
+    dimensions: int,
+    texts: Sequence[str],
+    embeddings: Sequence[List[float]],
+):
+    cache = response_cache()
+    if cache is None:
+        return
+    for key, embedding in zip(_embedding_keys(model, dimensions, texts), embeddings):
+        _put(cache, key, struct.pack(f"<{len(embedding)}d", *embedding))
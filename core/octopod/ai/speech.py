@@ -0,0 +1,59 @@
+import json
+from hashlib import sha256
+
+from botocore.exceptions import ClientError
+
+from octopod.ai.client import openai_client
+from octopod.ai.limiter import limited
+from octopod.cache import DiskCache
+from octopod.config import config
+from octopod.metrics import count
+from octopod.storage import s3_client
+
+SPEECH_PREFIX = "cache/speech/"
+
+cache = DiskCache("speech", config.SPEECH_CACHE_BYTES)
+
+
+def speech_key(text: str, voice: str, model: str) -> str:
+    """Content address of a piece of synthesized speech."""
+    digest = sha256(json.dumps([model, voice, text]).encode()).hexdigest()
+    return f"{digest}.mp3"
+
+
+def synthesize(text: str, voice: str = "nova", model: str = "tts-1") -> bytes:
+    """Text to speech as MP3 bytes.
+
+    Speech is looked up in the worker-local cache, then in S3, and only synthesized when
+    neither has it, so unchanged intros are never paid for twice.
+    """
+    key = speech_key(text, voice, model)
+    if (cached := cache.read(key)) is not None:
+        return cached
+
+    s3 = s3_client()
+    try:
+        response = s3.get_object(Bucket=config.AWS_S3_BUCKET, Key=SPEECH_PREFIX + key)
+        data = response["Body"].read()
+        count(bytes_downloaded=len(data))
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        print(f"Synthesizing speech for {text!r}")
+        client = openai_client()
+        data = limited(
+            client.audio.speech.with_raw_response.create,
+            model=model,
+            voice=voice,
+            input=text,
+        ).content
+        s3.put_object(
+            Bucket=config.AWS_S3_BUCKET,
+            Key=SPEECH_PREFIX + key,
+            Body=data,
+            ContentType="audio/mpeg",
+        )
+        count(bytes_uploaded=len(data))
+
+    cache.put(key, data)
+    return data
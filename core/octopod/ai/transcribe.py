@@ -1,39 +1,41 @@
-from typing import List
-from pydantic import BaseModel
-from pydub import AudioSegment  # type: ignore
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+from octopod.audio import SPEECH_BIT_RATE, AudioSource
+from octopod.checkpoint import Checkpoints
 from octopod.config import config
-from openai import OpenAI
+from octopod.ai.client import openai_client
+from octopod.ai.limiter import limited
+from octopod.ai.transcript import Segment, Transcript
+from octopod.metrics import count
 import concurrent.futures
 
-CHUNK_MS = 5 * 60 * 1000
-MAX_WORKERS = 4
+WHISPER_UPLOAD_BYTES = 25 * 1024 * 1024
+# Chunks stay clear of the upload limit, even when the encoder overshoots its bit rate.
+MAX_CHUNK_SECONDS = 0.9 * WHISPER_UPLOAD_BYTES * 8 / SPEECH_BIT_RATE
+MIN_CHUNK_SECONDS = 2 * 60
+SILENCE_SEARCH_SECONDS = 10  # On either side of the target boundary
 
+Chunk = Tuple[float, float]  # Start and end, in seconds
 
-class Segment(BaseModel):
-    start_time: float
-    end_time: float
-    text: str
 
-
-def _transcribe(path_to_file: str, offset_secs: float) -> List[Segment]:
-    """Transcibe a single audio file.
+def _transcribe(audio: bytes, offset_secs: float) -> List[Segment]:
+    """Transcibe a single encoded chunk of audio.
 
     Args:
-        path_to_file (str): Path to the audio file.
+        audio (bytes): The chunk, as encoded by `AudioSource.encode_speech`.
         offset_secs (float): Offset to add to the start and end times of the segments.
     """
-    print(f"Transcribing {path_to_file} with offset {offset_secs}")
-    client = OpenAI(
-        api_key=config.OPENAI_API_KEY,
+    print(f"Transcribing {len(audio)} bytes with offset {offset_secs}")
+    client = openai_client()
+    response = limited(
+        client.audio.transcriptions.with_raw_response.create,
+        file=(f"chunk_{int(offset_secs * 1000)}.ogg", audio),
+        model="whisper-1",
+        response_format="verbose_json",
+        timestamp_granularities=["segment"],
     )
-    with open(path_to_file, "rb") as audio_file:
-        response = client.audio.transcriptions.create(
-            file=audio_file,
-            model="whisper-1",
-            response_format="verbose_json",
-            timestamp_granularities=["segment"],
-        )
-    print(f"Finished transcribing {path_to_file}")
+    count(bytes_uploaded=len(audio))
+    print(f"Finished transcribing chunk with offset {offset_secs}")
     return [
         Segment(
             start_time=segment["start"] + offset_secs,
@@ -44,22 +46,154 @@ def _transcribe(path_to_file: str, offset_secs: float) -> List[Segment]:
     ]
 
 
-def transcribe(source: AudioSegment) -> List[Segment]:
+def chunk_count(duration: float) -> int:
+    """Number of chunks an episode of `duration` seconds is transcribed in.
+
+    Chunks are as long as the upload limit allows and as short as it takes to keep
+    TRANSCRIBE_PARALLELISM requests busy, but never so short that Whisper lacks context.
+    """
+    return max(
+        math.ceil(duration / MAX_CHUNK_SECONDS),
+        min(config.TRANSCRIBE_PARALLELISM, int(duration // MIN_CHUNK_SECONDS)),
+        1,
+    )
+
+
+def plan_chunks(source: AudioSource) -> List[Chunk]:
+    """Split an episode into chunks which end in pauses, so that no word is cut in half.
+
+    Only a short window around every boundary is decoded to find the pause.
+    """
+    chunks = chunk_count(source.duration)
+    targets = [source.duration * i / chunks for i in range(1, chunks)]
+    boundaries = [
+        source.quietest(
+            target - SILENCE_SEARCH_SECONDS, target + SILENCE_SEARCH_SECONDS
+        )
+        for target in targets
+    ]
+    edges = [0.0, *boundaries, source.duration]
+    return list(zip(edges, edges[1:]))
+
+
+class TranscriptionBackend:
+    """Turns chunks of an episode into segments, timed from the start of the episode."""
+
+    def transcribe(
+        self, source: AudioSource, chunks: Dict[int, Chunk]
+    ) -> Iterator[Tuple[int, List[Segment]]]:
+        """Transcribe chunks by their index, yielding each as soon as it is transcribed."""
+        raise NotImplementedError
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """Whisper through the OpenAI API.
+
+    Chunks are encoded in memory by ENCODE_WORKERS encoders and each one is uploaded for
+    transcription as soon as it is encoded, while the next ones are still encoding.
+    """
+
+    def transcribe(
+        self, source: AudioSource, chunks: Dict[int, Chunk]
+    ) -> Iterator[Tuple[int, List[Segment]]]:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(config.ENCODE_WORKERS, len(chunks)))
+        ) as encoder, concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(config.TRANSCRIBE_PARALLELISM, len(chunks)))
+        ) as uploader:
+            encoding = {
+                encoder.submit(source.encode_speech, start, end - start): i
+                for i, (start, end) in chunks.items()
+            }
+            transcribing = {
+                uploader.submit(
+                    _transcribe, future.result(), chunks[encoding[future]][0]
+                ): encoding[future]
+                for future in concurrent.futures.as_completed(encoding)
+            }
+            for future in concurrent.futures.as_completed(transcribing):
+                yield transcribing[future], future.result()
+
+
+def backend() -> TranscriptionBackend:
+    """The transcription backend selected by TRANSCRIPTION_BACKEND."""
+    if config.TRANSCRIPTION_BACKEND == "local":
+        from octopod.ai.local_whisper import LocalWhisperBackend
+
+        return LocalWhisperBackend()
+    return OpenAIBackend()
+
+
+def _load_chunk(
+    index: int, checkpoints: Optional[Checkpoints]
+) -> Optional[List[Segment]]:
+    if checkpoints is None:
+        return None
+    saved = checkpoints.load(f"transcript/{index}")
+    if saved is None:
+        return None
+    return [Segment(**segment) for segment in saved]
+
+
+def _stream_chunks(
+    source: AudioSource, chunks: Dict[int, Chunk], checkpoints: Optional[Checkpoints]
+) -> Iterator[Tuple[int, List[Segment]]]:
+    """Transcribe chunks in the order they finish, checkpointed ones first."""
+    pending: Dict[int, Chunk] = {}
+    for i, chunk in chunks.items():
+        saved = _load_chunk(i, checkpoints)
+        if saved is None:
+            pending[i] = chunk
+        else:
+            yield i, saved
+    if not pending:
+        return
+    print(f"Transcribing {len(pending)} of {len(chunks)} chunks")
+    for i, segments in backend().transcribe(source, pending):
+        if checkpoints is not None:
+            checkpoints.save(
+                f"transcript/{i}", [segment.model_dump() for segment in segments]
+            )
+        yield i, segments
+
+
+def transcribe_chunk(
+    source: AudioSource,
+    chunk: Chunk,
+    index: int,
+    checkpoints: Optional[Checkpoints] = None,
+) -> List[Segment]:
+    """Transcribe the `index`-th chunk of an audio file.
+
+    Only the chunk is decoded from the source, and its transcript is checkpointed so that it is
+    never paid for twice.
+    """
+    return dict(_stream_chunks(source, {index: chunk}, checkpoints))[index]
+
+
+def transcribe_stream(
+    source: AudioSource, checkpoints: Optional[Checkpoints] = None
+) -> Iterator[Transcript]:
+    """Transcribe an audio file, yielding the transcript of every chunk in order.
+
+    Chunks are transcribed in parallel, and each is yielded as soon as it and every chunk
+    before it are done, so the start of the transcript can be used before the end is ready.
+    """
+    chunks = plan_chunks(source)
+    done: Dict[int, List[Segment]] = {}
+    following = 0
+    for i, segments in _stream_chunks(source, dict(enumerate(chunks)), checkpoints):
+        done[i] = segments
+        while following in done:
+            yield Transcript.from_segments(done.pop(following))
+            following += 1
+
+
+def transcribe(
+    source: AudioSource, checkpoints: Optional[Checkpoints] = None
+) -> Transcript:
     """Transcribe an audio file.
 
-    Chunk the audio file into smaller segments and transcribe each segment in parallel.
+    Chunk the audio file at pauses and transcribe the chunks in parallel.
     """
-    print(f"Chunking audio file into {CHUNK_MS} ms segments")
-    offset_ms = 0
-    queue = []
-    for i in range(0, len(source), CHUNK_MS):
-        chunk_file = f"/tmp/tmp_{i}.mp3"
-        chunk = source[i : i + CHUNK_MS]
-        chunk.export(chunk_file, format="mp3")
-        queue.append((chunk_file, offset_ms / 1000))
-        offset_ms += CHUNK_MS
-    print(f"Transcribing {len(queue)} segments in parallel")
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        results = list(executor.map(lambda x: _transcribe(x[0], x[1]), queue))
-    return [segment for result in results for segment in result]
+    return Transcript.concat(transcribe_stream(source, checkpoints))
@@ -0,0 +1,176 @@
+import struct
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from octopod.checkpoint import Store
+
+MAGIC = b"OCTR"
+VERSION = 1
+# Magic, version, number of lines and length of the encoded text.
+HEADER = struct.Struct("<4sIQQ")
+
+
+class Segment(BaseModel):
+    start_time: float
+    end_time: float
+    text: str
+
+
+@dataclass(frozen=True, eq=False)
+class Transcript:
+    """Lines of a transcript as columns.
+
+    The text of all lines is a single string, in which the lines are separated by a space, and
+    `offsets` holds where every line starts, plus where a line after the last one would start.
+    Slicing a transcript by lines is zero-copy: the slice shares the arrays and the text of the
+    transcript it was sliced from.
+    """
+
+    starts: np.ndarray  # Seconds, float64
+    ends: np.ndarray
+    offsets: np.ndarray  # Into `text`, int64, one more than there are lines
+    text: str
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Segment]) -> "Transcript":
+        segments = list(segments)
+        texts = [segment.text for segment in segments]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) + 1 for text in texts], out=offsets[1:])
+        return cls(
+            starts=np.array([s.start_time for s in segments], dtype=np.float64),
+            ends=np.array([s.end_time for s in segments], dtype=np.float64),
+            offsets=offsets,
+            text=" ".join(texts),
+        )
+
+    @classmethod
+    def concat(cls, transcripts: Iterable["Transcript"]) -> "Transcript":
+        transcripts = [t.compact() for t in transcripts if len(t)]
+        if not transcripts:
+            return cls.from_segments([])
+        ends = np.cumsum([0] + [t.offsets[-1] for t in transcripts[:-1]])
+        return cls(
+            starts=np.concatenate([t.starts for t in transcripts]),
+            ends=np.concatenate([t.ends for t in transcripts]),
+            offsets=np.concatenate(
+                [t.offsets[:-1] + end for t, end in zip(transcripts, ends)]
+                + [transcripts[-1].offsets[-1:] + ends[-1]]
+            ),
+            text=" ".join(t.text for t in transcripts),
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, key: slice) -> "Transcript":
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise TypeError("Transcripts can only be sliced as [start:stop]")
+        stop = max(start, stop)
+        return Transcript(
+            self.starts[start:stop],
+            self.ends[start:stop],
+            self.offsets[start : stop + 1],
+            self.text,
+        )
+
+    def line(self, index: int) -> str:
+        return self.text[self.offsets[index] : self.offsets[index + 1] - 1]
+
+    def lines(self) -> Iterator[str]:
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield self.text[start : end - 1]
+
+    def joined(self) -> str:
+        """The text of every line, separated by spaces, without joining anything."""
+        if not len(self):
+            return ""
+        return self.text[self.offsets[0] : self.offsets[-1] - 1]
+
+    def segments(self) -> List[Segment]:
+        return [
+            Segment(start_time=start, end_time=end, text=text)
+            for start, end, text in zip(
+                self.starts.tolist(), self.ends.tolist(), self.lines()
+            )
+        ]
+
+    def line_at(self, seconds: float) -> int:
+        """Index of the last line which starts at or before `seconds`, by binary search."""
+        return max(0, int(np.searchsorted(self.starts, seconds, side="right")) - 1)
+
+    def between(self, start: float, end: float) -> "Transcript":
+        """The lines which overlap the time from `start` to `end` seconds."""
+        first = int(np.searchsorted(self.ends, start, side="right"))
+        last = int(np.searchsorted(self.starts, end, side="left"))
+        return self[first:last]
+
+    def compact(self) -> "Transcript":
+        """A copy which only holds the text of its own lines, with offsets from zero."""
+        if (
+            len(self)
+            and self.offsets[0] == 0
+            and self.offsets[-1] == len(self.text) + 1
+        ):
+            return self
+        return Transcript(
+            self.starts.copy(),
+            self.ends.copy(),
+            self.offsets - self.offsets[0],
+            self.joined(),
+        )
+
+    def to_bytes(self) -> bytes:
+        """A compact binary encoding, which loads without parsing a single line."""
+        transcript = self.compact()
+        text = transcript.text.encode()
+        return b"".join(
+            [
+                HEADER.pack(MAGIC, VERSION, len(transcript), len(text)),
+                transcript.starts.astype("<f8").tobytes(),
+                transcript.ends.astype("<f8").tobytes(),
+                transcript.offsets.astype("<i8").tobytes(),
+                text,
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Transcript":
+        """Decode `to_bytes`. The columns are read in place, without copying them."""
+        magic, version, count, text_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} transcript")
+        position = HEADER.size
+        columns = []
+        for dtype, length in (("<f8", count), ("<f8", count), ("<i8", count + 1)):
+            columns.append(
+                np.frombuffer(data, dtype=dtype, count=length, offset=position)
+            )
+            position += 8 * length
+        starts, ends, offsets = columns
+        text = data[position : position + text_length].decode()
+        return cls(starts, ends, offsets, text)
+
+
+def save_transcript(store: Store, name: str, transcript: Transcript):
+    store.save_bytes(f"{name}.bin", transcript.to_bytes())
+
+
+def load_transcript(store: Store, name: str) -> Optional[Transcript]:
+    """The saved transcript, or None if there is none."""
+    data = store.load_bytes(f"{name}.bin")
+    if data is None:
+        return None
+    return Transcript.from_bytes(data)
+
+
+def require_transcript(store: Store, name: str) -> Transcript:
+    """The saved transcript, which must exist."""
+    transcript = load_transcript(store, name)
+    if transcript is None:
+        raise ValueError(f"Missing {store.prefix}{name}")
+    return transcript
@@ -0,0 +1,216 @@
+import json
+import subprocess
+from dataclasses import dataclass
+from typing import Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+from pydub import AudioSegment  # type: ignore
+
+from octopod.metrics import count
+
+SAMPLE_WIDTH = 2  # Decoded audio is always 16-bit signed PCM.
+ANALYSIS_RATE = 8000  # Hz, plenty to tell speech from pauses
+FRAME_MS = 20
+PAUSE_MS = 300
+SPEECH_RATE = 16000  # Hz, what speech recognition models resample to anyway
+SPEECH_BIT_RATE = 24_000
+PROBE_TIMEOUT = 60.0  # Seconds, for ffprobe to read the header of a file or URL
+
+
+def rms(samples: np.ndarray, frame: int) -> np.ndarray:
+    """Root mean square energy of every full frame of `frame` samples."""
+    frames = samples[: len(samples) // frame * frame].reshape(-1, frame)
+    return np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+
+
+def _slice_ms(key: slice, length: int) -> Tuple[int, int]:
+    if not isinstance(key, slice) or key.step is not None:
+        raise TypeError("Audio can only be sliced as [start_ms:end_ms]")
+    start_ms = max(0, key.start or 0)
+    end_ms = length if key.stop is None else min(length, key.stop)
+    return start_ms, max(start_ms, end_ms)
+
+
+@dataclass
+class AudioSource:
+    """An audio file which is decoded on demand.
+
+    Only the container header is read up front. Slicing with millisecond indices, just like a
+    pydub `AudioSegment`, decodes the requested range through an ffmpeg pipe, so memory use is
+    bounded by the size of the slice rather than the length of the episode.
+    """
+
+    path: str
+    duration: float  # Seconds
+    frame_rate: int
+    channels: int
+    bit_rate: int = 0  # Bits per second of the encoded audio, 0 if unknown
+
+    @classmethod
+    def probe(cls, path: str, timeout: float = PROBE_TIMEOUT) -> "AudioSource":
+        """Read the duration and stream layout of an audio file (or URL) with ffprobe.
+
+        A host which stalls for `timeout` seconds raises `subprocess.TimeoutExpired`.
+        """
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-rw_timeout",
+                str(int(timeout * 1_000_000)),  # Microseconds, per read
+                "-select_streams",
+                "a:0",
+                "-show_entries",
+                "format=duration,bit_rate:stream=sample_rate,channels",
+                "-of",
+                "json",
+                path,
+            ],
+            capture_output=True,
+            check=True,
+            timeout=timeout,
+        )
+        info = json.loads(result.stdout)
+        if not info.get("streams"):
+            raise ValueError(f"No audio stream found in {path}")
+        stream = info["streams"][0]
+        return cls(
+            path=path,
+            duration=float(info["format"]["duration"]),
+            frame_rate=int(stream["sample_rate"]),
+            channels=int(stream["channels"]),
+            bit_rate=int(info["format"].get("bit_rate", 0)),
+        )
+
+    def __len__(self) -> int:
+        """Length in milliseconds, for parity with `AudioSegment`."""
+        return int(self.duration * 1000)
+
+    def range_bytes(self, duration: float) -> int:
+        """Estimated size of `duration` seconds of the encoded audio."""
+        return int(self.bit_rate * duration / 8)
+
+    @property
+    def remote(self) -> bool:
+        """Whether the audio is read from a URL rather than from a local file."""
+        return urlparse(self.path).scheme in ("http", "https")
+
+    def count_read(self, duration: float):
+        """Count `duration` seconds of the audio as downloaded, if it was read from a URL."""
+        if self.remote:
+            count(bytes_downloaded=self.range_bytes(duration))
+
+    def __getitem__(self, key: slice) -> AudioSegment:
+        start_ms, end_ms = _slice_ms(key, len(self))
+        return self.decode(start_ms / 1000, (end_ms - start_ms) / 1000)
+
+    def _pcm(
+        self, start: float, duration: float, frame_rate: int, channels: int
+    ) -> bytes:
+        """16-bit PCM of `duration` seconds of audio beginning at `start` seconds."""
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-ss",
+                f"{start:.3f}",
+                "-t",
+                f"{duration:.3f}",
+                "-i",
+                self.path,
+                "-f",
+                "s16le",
+                "-acodec",
+                "pcm_s16le",
+                "-ac",
+                str(channels),
+                "-ar",
+                str(frame_rate),
+                "-",
+            ],
+            capture_output=True,
+            check=True,
+        )
+        self.count_read(duration)
+        return result.stdout
+
+    def encode_speech(self, start: float, duration: float) -> bytes:
+        """Encode `duration` seconds beginning at `start` seconds for speech recognition.
+
+        The audio is encoded straight into memory as mono Opus at SPEECH_BIT_RATE, which is
+        plenty for speech and a fraction of the size of the source.
+        """
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-ss",
+                f"{start:.3f}",
+                "-t",
+                f"{duration:.3f}",
+                "-i",
+                self.path,
+                "-vn",
+                "-ac",
+                "1",
+                "-ar",
+                str(SPEECH_RATE),
+                "-c:a",
+                "libopus",
+                "-b:a",
+                str(SPEECH_BIT_RATE),
+                "-application",
+                "voip",
+                "-f",
+                "ogg",
+                "pipe:1",
+            ],
+            capture_output=True,
+            check=True,
+        )
+        self.count_read(duration)
+        return result.stdout
+
+    def decode(self, start: float, duration: float) -> AudioSegment:
+        """Decode `duration` seconds of audio beginning at `start` seconds."""
+        if duration <= 0:
+            return AudioSegment.silent(duration=0, frame_rate=self.frame_rate)
+        return AudioSegment(
+            data=self._pcm(start, duration, self.frame_rate, self.channels),
+            sample_width=SAMPLE_WIDTH,
+            frame_rate=self.frame_rate,
+            channels=self.channels,
+        )
+
+    def samples(
+        self, start: float, duration: float, frame_rate: int = ANALYSIS_RATE
+    ) -> np.ndarray:
+        """Mono samples of `duration` seconds beginning at `start` seconds."""
+        if duration <= 0:
+            return np.zeros(0, dtype=np.int16)
+        pcm = self._pcm(start, duration, frame_rate, 1)
+        return np.frombuffer(pcm, dtype=np.int16)
+
+    def quietest(self, start: float, end: float) -> float:
+        """The time in seconds of the quietest moment between `start` and `end` seconds.
+
+        Moments are PAUSE_MS long, so that a pause between words wins over a single quiet frame.
+        """
+        energy = rms(self.samples(start, end - start), ANALYSIS_RATE * FRAME_MS // 1000)
+        width = PAUSE_MS // FRAME_MS
+        if len(energy) < width:
+            return (start + end) / 2
+        # Mean energy of every run of `width` frames, from a running sum.
+        sums = np.cumsum(np.concatenate([[0.0], energy]))
+        pauses = sums[width:] - sums[:-width]
+        # A pause longer than a moment is cut in its middle, not wherever its noise is lowest.
+        best = int(np.argmin(pauses))
+        loud = np.flatnonzero(pauses > 2 * pauses[best] + 1)
+        first = loud[loud < best].max(initial=-1) + 1
+        last = loud[loud > best].min(initial=len(pauses)) - 1
+        center = (first + last) / 2 + width / 2
+        return start + center * FRAME_MS / 1000
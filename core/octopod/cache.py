@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+from typing import Optional
+
+from octopod.config import config
+
+# Eviction runs once this fraction of the size budget was written since it last ran, and trims
+# the cache to the rest of the budget, so the cache outgrows its budget by at most this much.
+EVICT_FRACTION = 0.1
+
+
+class DiskCache:
+    """A worker-local directory of cached files with a size budget.
+
+    Files are written atomically, so several processes and threads on one host can share a
+    cache, and the least recently used files are evicted once the directory grows past
+    `max_bytes`. The cache lives on disk because rq forks a new work horse for every job.
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._written = 0  # Bytes put since the last eviction
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        path = os.path.join(config.CACHE_DIR, self.name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Path to the cached file, or None on a miss."""
+        path = self.path(key)
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def read(self, key: str) -> Optional[bytes]:
+        """The cached file, or None on a miss or when it is evicted while being read."""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._lock:
+            self._written += len(data)
+            due = self._written >= self.max_bytes * EVICT_FRACTION
+            if due:
+                self._written = 0
+        if due:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Drop least recently used files until the cache fits in its size budget, less the
+        room for what is written until the next eviction. Files which other threads or
+        processes evict at the same time are skipped."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * (1 - EVICT_FRACTION)
+        for _, size, path in files[:-1]:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,200 @@
+import json
+import sys
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from hashlib import sha256
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+import boto3
+import requests
+from botocore.exceptions import ClientError
+
+from octopod.config import config
+from octopod.metrics import count
+from octopod.storage import s3_client
+
+CHECKPOINT_PREFIX = "checkpoints/"
+ARTIFACT_PREFIX = "artifacts/"
+
+# Bump whenever the shape or meaning of a stage output changes to invalidate old checkpoints.
+PIPELINE_VERSION = 1
+
+SAMPLE_BYTES = 256 * 1024
+SAMPLES = 4
+
+
+def _sample_ranges(size: int) -> List[Tuple[int, int]]:
+    """Evenly spaced byte ranges, from the start to the end of the file, inclusive."""
+    if size <= SAMPLES * SAMPLE_BYTES:
+        return [(0, size - 1)]
+    starts = [i * (size - SAMPLE_BYTES) // (SAMPLES - 1) for i in range(SAMPLES)]
+    return [(start, start + SAMPLE_BYTES - 1) for start in starts]
+
+
+def _iter_ranges(
+    chunks: Iterable[bytes], ranges: List[Tuple[int, int]]
+) -> Iterator[bytes]:
+    """The pieces within `ranges` of a file which is streamed in `chunks`, as they arrive.
+
+    The ranges are in order, and the rest of the file is not read once they are complete.
+    """
+    offset = 0
+    for chunk in chunks:
+        for start, end in ranges:
+            low, high = max(start, offset), min(end + 1, offset + len(chunk))
+            if low < high:
+                yield chunk[low - offset : high - offset]
+        offset += len(chunk)
+        if offset > ranges[-1][1]:
+            break
+
+
+def _stream(response: requests.Response) -> Iterator[bytes]:
+    """The body of a streamed response, counted as downloaded as it arrives."""
+    for chunk in response.iter_content(chunk_size=1_048_576):
+        count(bytes_downloaded=len(chunk))
+        yield chunk
+
+
+def input_hash(audio_url: str) -> str:
+    """Fingerprint of the audio behind a URL, from its size and a few sampled byte ranges.
+
+    Only a megabyte is fetched, with range requests, so identical audio is recognized in well
+    under a second no matter which URL it is uploaded under. Servers which refuse HEAD requests
+    or do not support range requests have the file streamed through instead, and the samples
+    are taken from the stream, which gives the same fingerprint.
+    """
+    try:
+        response = requests.head(audio_url, allow_redirects=True)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Failed to HEAD {audio_url}, streaming it instead: {e!r}")
+        return _streamed_hash(audio_url)
+    size = int(response.headers.get("Content-Length", 0))
+    if not size or response.headers.get("Accept-Ranges") != "bytes":
+        return _streamed_hash(audio_url)
+
+    digest = sha256(json.dumps([PIPELINE_VERSION, size]).encode())
+    ranges = _sample_ranges(size)
+    for i, (start, end) in enumerate(ranges):
+        headers = {"Range": f"bytes={start}-{end}"}
+        with requests.get(audio_url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # The range was ignored and the whole file is on its way, so the remaining
+                # samples are taken from it rather than requested one by one.
+                for piece in _iter_ranges(_stream(response), ranges[i:]):
+                    digest.update(piece)
+                break
+            for chunk in _stream(response):
+                digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def _streamed_hash(audio_url: str) -> str:
+    """`input_hash` of a file which is streamed from its start."""
+    with requests.get(audio_url, stream=True) as response:
+        response.raise_for_status()
+        size = int(response.headers.get("Content-Length", 0))
+        digest = sha256(json.dumps([PIPELINE_VERSION, size]).encode())
+        # Without a size the whole file is hashed, one chunk at a time.
+        ranges = _sample_ranges(size) if size else [(0, sys.maxsize)]
+        for piece in _iter_ranges(_stream(response), ranges):
+            digest.update(piece)
+    return digest.hexdigest()[:32]
+
+
+class Store(ABC):
+    """JSON documents and binary objects under a prefix of the bucket."""
+
+    @property
+    @abstractmethod
+    def prefix(self) -> str: ...
+
+    def load_bytes(self, key: str) -> Optional[bytes]:
+        """The saved object, or None if there is none."""
+        try:
+            response = s3_client().get_object(
+                Bucket=config.AWS_S3_BUCKET, Key=f"{self.prefix}{key}"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
+        data = response["Body"].read()
+        count(bytes_downloaded=len(data))
+        return data
+
+    def save_bytes(
+        self, key: str, data: bytes, content_type: str = "application/octet-stream"
+    ):
+        s3_client().put_object(
+            Bucket=config.AWS_S3_BUCKET,
+            Key=f"{self.prefix}{key}",
+            Body=data,
+            ContentType=content_type,
+        )
+        count(bytes_uploaded=len(data))
+
+    def load(self, name: str) -> Optional[Any]:
+        """The saved document, or None if there is none."""
+        data = self.load_bytes(f"{name}.json")
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def require(self, name: str) -> Any:
+        """The saved document, which must exist."""
+        data = self.load(name)
+        if data is None:
+            raise ValueError(f"Missing {self.prefix}{name}")
+        return data
+
+    def save(self, name: str, data: Any):
+        self.save_bytes(
+            f"{name}.json", json.dumps(data).encode(), content_type="application/json"
+        )
+
+
+@dataclass
+class Checkpoints(Store):
+    """Outputs of the stages of a processing run, persisted in S3.
+
+    Checkpoints are keyed by podcast and input hash, so a retried or re-enqueued job for the
+    same audio picks up where the last attempt stopped, while new audio starts from scratch.
+    """
+
+    podcast_id: UUID
+    input_hash: str
+
+    @property
+    def prefix(self) -> str:
+        return f"{CHECKPOINT_PREFIX}{self.podcast_id}/{self.input_hash}/"
+
+    def clear(self):
+        """Drop every checkpoint of the podcast, including those for earlier inputs."""
+        bucket = boto3.resource("s3", endpoint_url=config.AWS_S3_ENDPOINT_URL).Bucket(
+            config.AWS_S3_BUCKET
+        )
+        bucket.objects.filter(Prefix=f"{CHECKPOINT_PREFIX}{self.podcast_id}/").delete()
+
+
+@dataclass
+class Artifacts(Store):
+    """Transcript, podclips and renders of a finished run, indexed by input hash.
+
+    Unlike checkpoints they are kept, and shared by every podcast, so audio which is submitted
+    again reuses them instead of being transcribed and extracted from scratch.
+    """
+
+    input_hash: str
+
+    @property
+    def prefix(self) -> str:
+        return f"{ARTIFACT_PREFIX}{self.input_hash}/"
+
+    @staticmethod
+    def renders_name(creator: str) -> str:
+        """Renders include a spoken intro which names the creator."""
+        return f"renders/{sha256(creator.encode()).hexdigest()[:16]}"
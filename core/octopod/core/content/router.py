@@ -5,6 +5,7 @@ from random import shuffle
 import boto3
 from botocore.config import Config as BotocoreConfig
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -35,8 +36,14 @@ from octopod.models import (
     PlayEvent,
     Payment,
 )
-from octopod.queue import worker_queue
-from octopod.worker import tasks
+from octopod.queue import (
+    SIZE_CLASSES,
+    Tier,
+    podcast_queue,
+    podcast_retry,
+    podcast_tier,
+)
+from octopod.worker import pipeline
 from octopod.nwc import send_to_uma  # type: ignore
 
 router = APIRouter(prefix="/content", tags=["content"])
@@ -106,7 +113,12 @@ async def create_podcast(
     db.add(podcast)
     await db.commit()
     await db.refresh(podcast)
-    worker_queue.enqueue(tasks.handle_podcast, podcast.id, job_timeout=3600)
+    await run_in_threadpool(
+        pipeline.enqueue_podcast,
+        podcast.id,
+        podcast.audio_url,
+        podcast_tier(request.published_at),
+    )
     return await get_podcast(podcast.id, db)
 
 
@@ -146,6 +158,15 @@ async def update_podcast(
     if podcast.creator_id != token.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    audio_changed = request.audio_url not in (None, podcast.audio_url)
+    if audio_changed and podcast.status in (
+        PodcastStatus.Created,
+        PodcastStatus.Processing,
+    ):
+        # A second run of the same podcast would clear the checkpoints of the first.
+        raise HTTPException(
+            status_code=409, detail="The audio can not change while it is processed"
+        )
     for attr in request.model_fields_set:
         if getattr(request, attr) is not None:
             setattr(podcast, attr, getattr(request, attr))
@@ -153,6 +174,11 @@ async def update_podcast(
     await db.commit()
     await db.refresh(podcast)
 
+    if audio_changed:
+        # Identical audio under a new URL reuses the artifacts of the last run.
+        await run_in_threadpool(
+            pipeline.enqueue_podcast, podcast.id, podcast.audio_url, Tier.Reprocess
+        )
     return await get_podcast(podcast.id, db)
 
 
@@ -247,20 +273,50 @@ async def update_podclip(
     token: TokenData = Depends(decode_creator_token),
     db: AsyncSession = Depends(get_db),
 ) -> Podclip:
+    """Edit a podclip.
+
+    A new title or new boundaries change the audio of the podclip, so it is rendered again in
+    the background, leaving the rest of the podcast alone.
+    """
     result = await db.execute(select(PodclipModel).where(PodclipModel.id == podclip_id))
     podclip = result.scalar()
     if not podclip:
         raise HTTPException(status_code=404, detail="Podclip not found")
-    if podclip.podcast.creator_id != token.id:
+    podcast = await podclip.awaitable_attrs.podcast
+    if podcast.creator_id != token.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    start_time = (
+        podclip.start_time if request.start_time is None else request.start_time
+    )
+    end_time = podclip.end_time if request.end_time is None else request.end_time
+    if not 0 <= start_time < end_time or (
+        podcast.duration and end_time > podcast.duration
+    ):
+        raise HTTPException(status_code=400, detail="Invalid podclip boundaries")
+    rerender = (request.title, start_time, end_time) != (
+        podclip.title,
+        podclip.start_time,
+        podclip.end_time,
+    )
+
     for attr in request.model_fields_set:
         if getattr(request, attr) is not None:
             setattr(podclip, attr, getattr(request, attr))
+    podclip.duration = int(end_time - start_time)
 
     await db.commit()
     await db.refresh(podclip)
 
+    if rerender:
+        # A single podclip always fits the smallest size class.
+        podcast_queue(Tier.Reprocess, SIZE_CLASSES[0]).enqueue(
+            pipeline.rerender_podclip,
+            podcast.id,
+            podclip.id,
+            job_timeout=pipeline.STAGE_TIMEOUT,
+            retry=podcast_retry,
+        )
     return await get_podclip(podclip.id, db)
 
 
@@ -71,11 +71,21 @@ class UpdatePodcastRequest(BaseModel):
         description="Date and time of publication."
     )
     cover_url: Optional[str] = Field(description="URL to the podcast cover image.")
+    audio_url: Optional[str] = Field(
+        default=None,
+        description="Audio file with the full podcast. Changing it processes the podcast again.",
+    )
 
 
 class UpdatePodclipRequest(BaseModel):
     title: str = Field(description="Title of the podclip.")
     description: str = Field(description="Description of the podclip.")
+    start_time: Optional[float] = Field(
+        default=None, description="Start of the podclip in the podcast, in seconds."
+    )
+    end_time: Optional[float] = Field(
+        default=None, description="End of the podclip in the podcast, in seconds."
+    )
 
 
 class PresignedUrlResponse(BaseModel):
@@ -1,5 +1,5 @@
 from uuid import UUID
-from typing import Annotated, List
+from typing import Annotated, Dict, List
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import distinct, func, select
@@ -24,9 +24,15 @@ from octopod.core.creator.schema import (
     CreatorStatistics,
     PodcastAnalytics,
     PodclipAnalytics,
+    ProcessingRunReport,
+    ProcessingStageReport,
 )
 from octopod.core.content.router import get_podcast
-from octopod.models import Podclip as PodclipModel, Podcast as PodcastModel
+from octopod.models import (
+    Podclip as PodclipModel,
+    Podcast as PodcastModel,
+    ProcessingStage,
+)
 
 router = APIRouter(prefix="/creator", tags=["creator"])
 
@@ -350,3 +356,63 @@ async def podcast_breakdown(
         podcast=podcast,
         podclips=podclips,
     )
+
+
+@router.get("/podcast/{podcast_id}/processing")
+async def podcast_processing(
+    podcast_id: UUID,
+    token: TokenData = Depends(decode_creator_token),
+    db: AsyncSession = Depends(get_db),
+) -> List[ProcessingRunReport]:
+    """Resource use of every processing run of a podcast, most recent first."""
+    podcast = await db.get(PodcastModel, podcast_id)
+    if not podcast:
+        raise HTTPException(status_code=404, detail="Podcast not found")
+    if podcast.creator_id != token.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    result = await db.execute(
+        select(ProcessingStage)
+        .where(ProcessingStage.podcast_id == podcast_id)
+        .order_by(ProcessingStage.started_at)
+    )
+    runs: Dict[str, List[ProcessingStage]] = {}
+    for record in result.scalars().all():
+        runs.setdefault(record.run_id, []).append(record)
+
+    reports = [
+        ProcessingRunReport(
+            run_id=run_id,
+            started_at=min(r.started_at for r in stages),
+            finished_at=max(r.created_at for r in stages),
+            cpu_seconds=sum(r.cpu_seconds for r in stages),
+            peak_rss_bytes=max(r.peak_rss_bytes for r in stages),
+            bytes_downloaded=sum(r.bytes_downloaded for r in stages),
+            bytes_uploaded=sum(r.bytes_uploaded for r in stages),
+            api_calls=sum(r.api_calls for r in stages),
+            api_retries=sum(r.api_retries for r in stages),
+            cache_hits=sum(r.cache_hits for r in stages),
+            cache_misses=sum(r.cache_misses for r in stages),
+            stages=[
+                ProcessingStageReport(
+                    stage=r.stage,
+                    attempt=r.attempt,
+                    started_at=r.started_at,
+                    recorded_at=r.created_at,
+                    wall_seconds=r.wall_seconds,
+                    cpu_seconds=r.cpu_seconds,
+                    peak_rss_bytes=r.peak_rss_bytes,
+                    bytes_downloaded=r.bytes_downloaded,
+                    bytes_uploaded=r.bytes_uploaded,
+                    api_calls=r.api_calls,
+                    api_retries=r.api_retries,
+                    cache_hits=r.cache_hits,
+                    cache_misses=r.cache_misses,
+                    error=r.error,
+                )
+                for r in stages
+            ],
+        )
+        for run_id, stages in runs.items()
+    ]
+    return sorted(reports, key=lambda report: report.started_at, reverse=True)
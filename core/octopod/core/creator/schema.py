@@ -1,6 +1,6 @@
 from uuid import UUID
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 from octopod.core.content.schema import Podcast, Podclip
@@ -56,3 +56,37 @@ class PodcastAnalytics(BaseModel):
 
     podcast: Podcast
     podclips: List[PodclipAnalytics]
+
+
+class ProcessingStageReport(BaseModel):
+
+    stage: str
+    attempt: int
+    started_at: datetime
+    recorded_at: datetime
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_bytes: int
+    bytes_downloaded: int
+    bytes_uploaded: int
+    api_calls: int
+    api_retries: int
+    cache_hits: int
+    cache_misses: int
+    error: Optional[str]
+
+
+class ProcessingRunReport(BaseModel):
+
+    run_id: str
+    started_at: datetime
+    finished_at: datetime
+    cpu_seconds: float
+    peak_rss_bytes: int
+    bytes_downloaded: int
+    bytes_uploaded: int
+    api_calls: int
+    api_retries: int
+    cache_hits: int
+    cache_misses: int
+    stages: List[ProcessingStageReport]
@@ -0,0 +1,103 @@
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+
+@dataclass
+class StageMetrics:
+    """Resource use of a single stage of a processing run."""
+
+    stage: str
+    started_at: datetime
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0  # Including ffmpeg and other child processes
+    # Of this process during the stage, or of a larger child process (such as ffmpeg) than any
+    # before it. Without /proc, of this process since it started.
+    peak_rss_bytes: int = 0
+    bytes_downloaded: int = 0
+    bytes_uploaded: int = 0
+    api_calls: int = 0
+    api_retries: int = 0
+    cache_hits: int = 0  # Of chat and embedding responses
+    cache_misses: int = 0
+    error: Optional[str] = None
+
+
+# The stage being measured. It is process-global rather than a context variable so that the
+# thread pools of a stage count towards it too. rq runs every job in its own work horse.
+_current: Optional[StageMetrics] = None
+_lock = threading.Lock()
+
+
+def count(**counters: int):
+    """Add to the counters of the stage being measured, if any."""
+    with _lock:
+        if _current is None:
+            return
+        for name, value in counters.items():
+            setattr(_current, name, getattr(_current, name) + value)
+
+
+def _cpu_seconds() -> float:
+    usage = [
+        resource.getrusage(who)
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    ]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS of this process, where Linux allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes() -> int:
+    """Peak RSS of this process since it was last reset, or else since it started."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _children_peak_rss_bytes() -> int:
+    """Peak RSS of the largest child process so far. Linux reports kilobytes."""
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+
+@contextmanager
+def measure(stage: str) -> Iterator[StageMetrics]:
+    """Measure the wall time, CPU time, memory, traffic and API calls of a stage."""
+    global _current
+    metrics = StageMetrics(stage, started_at=datetime.now(timezone.utc))
+    with _lock:
+        previous, _current = _current, metrics
+    _reset_peak_rss()
+    start, start_cpu = time.perf_counter(), _cpu_seconds()
+    children_peak = _children_peak_rss_bytes()
+    try:
+        yield metrics
+    except Exception as e:
+        metrics.error = repr(e)
+        raise
+    finally:
+        metrics.wall_seconds = time.perf_counter() - start
+        metrics.cpu_seconds = _cpu_seconds() - start_cpu
+        # Only the largest child so far is known, which counts if it ran in this stage.
+        children = _children_peak_rss_bytes()
+        metrics.peak_rss_bytes = max(
+            _peak_rss_bytes(), children if children > children_peak else 0
+        )
+        with _lock:
+            _current = previous
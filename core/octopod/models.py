@@ -5,7 +5,7 @@ from time import time
 from datetime import datetime
 from typing import Optional, List
 from uuid import UUID
-from sqlalchemy import DateTime, ForeignKey
+from sqlalchemy import BigInteger, DateTime, ForeignKey
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -167,3 +167,27 @@ class SkipEvent(Base):
     podclip: Mapped[Optional["Podclip"]] = relationship(
         "Podclip", backref="skip_events"
     )
+
+
+class ProcessingStage(Base):
+    """Resource use of one stage (rq job) of a podcast processing run."""
+
+    __tablename__ = "processing_stage"
+
+    podcast_id: Mapped[UUID] = mapped_column(ForeignKey("podcast.id"), index=True)
+    run_id: Mapped[str] = mapped_column()  # Job id of the run's process_podcast
+    stage: Mapped[str] = mapped_column()
+    attempt: Mapped[int] = mapped_column()
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    wall_seconds: Mapped[float] = mapped_column()
+    cpu_seconds: Mapped[float] = mapped_column()
+    peak_rss_bytes: Mapped[int] = mapped_column(BigInteger)
+    bytes_downloaded: Mapped[int] = mapped_column(BigInteger)
+    bytes_uploaded: Mapped[int] = mapped_column(BigInteger)
+    api_calls: Mapped[int] = mapped_column()
+    api_retries: Mapped[int] = mapped_column()
+    cache_hits: Mapped[int] = mapped_column()
+    cache_misses: Mapped[int] = mapped_column()
+    error: Mapped[Optional[str]] = mapped_column()
+
+    podcast: Mapped["Podcast"] = relationship("Podcast", backref="processing_stages")
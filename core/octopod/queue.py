@@ -1,5 +1,152 @@
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import List, Optional, Tuple, Union
+from uuid import UUID
+
 from redis import Redis
-from rq import Queue
+from rq import Queue, Retry
+from rq.job import Job
+
+from octopod.audio import AudioSource
 from octopod.config import config
 
-worker_queue = Queue(connection=Redis(host=config.REDIS_HOST))
+redis = Redis(host=config.REDIS_HOST)
+
+
+class Tier(str, Enum):
+    """Processing tiers, in the order workers drain them."""
+
+    Interactive = "interactive"  # Fresh uploads a creator is waiting on
+    Reprocess = "reprocess"  # Edits and reruns of processed podcasts
+    Backfill = "backfill"  # Back-catalog episodes
+
+
+@dataclass(frozen=True)
+class SizeClass:
+    """Episodes up to a length and size, and what a job over a whole episode needs."""
+
+    name: str
+    max_seconds: float
+    max_bytes: float
+    memory_mb: int  # Memory budget of a worker which may take these jobs
+    timeout: int  # Seconds
+
+
+# From smallest to largest. Jobs over a bounded part of an episode, like a transcript chunk or
+# a podclip, always fit the smallest class.
+SIZE_CLASSES = [
+    SizeClass("small", 45 * 60, 100e6, memory_mb=1024, timeout=30 * 60),
+    SizeClass("medium", 2 * 60 * 60, 400e6, memory_mb=2048, timeout=60 * 60),
+    SizeClass("large", math.inf, math.inf, memory_mb=4096, timeout=3 * 60 * 60),
+]
+SIZE_PROBE_TIMEOUT = 10.0  # Seconds
+
+
+def size_class(audio_url: str) -> SizeClass:
+    """Estimate the resources processing an episode needs from a probe of its header.
+
+    Episodes which can not be probed in time are assumed to be as large as they come. This runs
+    while a request is handled, so a stalled host must not hold it up for long.
+    """
+    try:
+        source = AudioSource.probe(audio_url, timeout=SIZE_PROBE_TIMEOUT)
+    except Exception as e:
+        print(f"Failed to probe {audio_url}: {e}")
+        return SIZE_CLASSES[-1]
+    size_bytes = source.range_bytes(source.duration)
+    for size in SIZE_CLASSES:
+        if source.duration <= size.max_seconds and size_bytes <= size.max_bytes:
+            return size
+    return SIZE_CLASSES[-1]
+
+
+def podcast_queue(tier: Tier, size: SizeClass) -> Queue:
+    return Queue(f"{tier.value}-{size.name}", connection=redis)
+
+
+def queue_classes(name: str) -> Tuple[Tier, SizeClass]:
+    """The tier and size class of a queue from `podcast_queue`."""
+    tier, size = name.rsplit("-", 1)
+    return Tier(tier), next(s for s in SIZE_CLASSES if s.name == size)
+
+
+def worker_queues(memory_mb: int) -> List[Queue]:
+    """The queues a worker with a memory budget may take jobs from, by priority.
+
+    Within a tier, the largest jobs the worker can take go first, since smaller workers can not
+    take them at all.
+    """
+    return [
+        podcast_queue(tier, size)
+        for tier in Tier
+        for size in reversed(SIZE_CLASSES)
+        if size.memory_mb <= memory_mb
+    ]
+
+
+# Processing is checkpointed, so retries resume where the failed attempt stopped.
+podcast_retry = Retry(max=2, interval=[60, 300])
+
+
+def job_attempt(job: Optional[Job]) -> int:
+    """Which attempt at a job enqueued with `podcast_retry` this is, starting at 1."""
+    if job is None or job.retries_left is None:
+        return 1
+    return podcast_retry.max - job.retries_left + 1
+
+
+def podcast_tier(published_at: Optional[datetime]) -> Tier:
+    """Back-catalog episodes are backfilled so they never hold up fresh uploads."""
+    if published_at is None:
+        return Tier.Interactive
+    if published_at.tzinfo is None:
+        published_at = published_at.replace(tzinfo=timezone.utc)
+    age = datetime.now(timezone.utc) - published_at
+    if age > timedelta(days=config.BACKFILL_AFTER_DAYS):
+        return Tier.Backfill
+    return Tier.Interactive
+
+
+# Holds a slot unless the creator is at the cap. Slots older than the TTL belong to crashed
+# runs and are reclaimed. Re-acquiring a held slot (a retried job) always succeeds.
+ACQUIRE_SLOT = redis.register_script(
+    """
+    redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1] - ARGV[3])
+    if redis.call("ZSCORE", KEYS[1], ARGV[4])
+        or redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[2]) then
+        redis.call("ZADD", KEYS[1], ARGV[1], ARGV[4])
+        redis.call("EXPIRE", KEYS[1], ARGV[3])
+        return 1
+    end
+    return 0
+    """
+)
+
+
+def _slots_key(creator_id: UUID) -> str:
+    return f"octopod:inflight:{creator_id}"
+
+
+def acquire_creator_slot(creator_id: UUID, podcast_id: UUID) -> bool:
+    """Claim one of the creator's CREATOR_MAX_INFLIGHT processing slots."""
+    now = datetime.now(timezone.utc).timestamp()
+    args: List[Union[str, float]] = [
+        now,
+        config.CREATOR_MAX_INFLIGHT,
+        config.CREATOR_SLOT_TTL,
+        str(podcast_id),
+    ]
+    return bool(ACQUIRE_SLOT(keys=[_slots_key(creator_id)], args=args))
+
+
+def release_creator_slot(creator_id: UUID, podcast_id: UUID):
+    redis.zrem(_slots_key(creator_id), str(podcast_id))
+
+
+def creator_retry_delay() -> timedelta:
+    """How long a podcast waits for a slot, jittered so deferred jobs do not bunch up."""
+    seconds = config.CREATOR_RETRY_SECONDS
+    return timedelta(seconds=random.uniform(seconds, 2 * seconds))
@@ -0,0 +1,80 @@
+import functools
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotocoreConfig
+
+from octopod.config import config
+from octopod.metrics import count
+
+# Parts are uploaded in parallel once an object outgrows a single part.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=config.S3_MULTIPART_CHUNK_BYTES,
+    multipart_chunksize=config.S3_MULTIPART_CHUNK_BYTES,
+    max_concurrency=config.S3_MAX_CONCURRENCY,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client():
+    """The S3 client of this process, shared by every thread.
+
+    Its connection pool is large enough for every upload worker to upload all parts of an
+    object at once, so connections are reused rather than opened for every request.
+    """
+    return boto3.client(
+        "s3",
+        endpoint_url=config.AWS_S3_ENDPOINT_URL,
+        config=BotocoreConfig(
+            max_pool_connections=config.UPLOAD_WORKERS * config.S3_MAX_CONCURRENCY,
+        ),
+    )
+
+
+# Connections must not be shared with a forked rq work horse.
+os.register_at_fork(after_in_child=s3_client.cache_clear)
+
+
+def public_url(key: str) -> str:
+    if config.AWS_S3_ENDPOINT_URL:
+        return f"{config.AWS_S3_ENDPOINT_URL}/{config.AWS_S3_BUCKET}/{key}"
+    return f"https://{config.AWS_S3_BUCKET}.s3.amazonaws.com/{key}"
+
+
+def upload_bytes(data: bytes, key: str, content_type: Optional[str] = None) -> str:
+    """Upload an in-memory object, in parallel parts if it is large, and return its URL."""
+    extra_args = {"ContentType": content_type} if content_type else None
+    s3_client().upload_fileobj(
+        BytesIO(data),
+        config.AWS_S3_BUCKET,
+        key,
+        ExtraArgs=extra_args,
+        Config=TRANSFER_CONFIG,
+    )
+    count(bytes_uploaded=len(data))
+    return public_url(key)
+
+
+class Uploader:
+    """A background pool of uploads, so that whatever produces the data never waits on S3.
+
+    Leaving the `with` block waits for every pending upload.
+    """
+
+    def __init__(self, max_workers: int = config.UPLOAD_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def upload(
+        self, data: bytes, key: str, content_type: Optional[str] = None
+    ) -> "Future[str]":
+        return self._executor.submit(upload_bytes, data, key, content_type)
+
+    def __enter__(self) -> "Uploader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(wait=True)
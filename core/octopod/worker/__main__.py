@@ -0,0 +1,39 @@
+"""Run a worker with `python -m octopod.worker`.
+
+The worker takes jobs from every queue its memory budget allows, and advertises the budget in
+its name, so `rq info` shows which workers can take which jobs.
+"""
+
+import os
+import socket
+from uuid import uuid4
+
+from rq import Worker
+
+from octopod.config import config
+from octopod.queue import redis, worker_queues
+
+
+def memory_budget_mb() -> int:
+    """WORKER_MEMORY_MB, or else the memory limit of the container or the host's memory."""
+    if config.WORKER_MEMORY_MB:
+        return config.WORKER_MEMORY_MB
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            return int(limit) // 2**20
+    except FileNotFoundError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+
+
+if __name__ == "__main__":
+    memory_mb = memory_budget_mb()
+    queues = worker_queues(memory_mb)
+    if not queues:
+        raise SystemExit(f"A memory budget of {memory_mb} MB fits no size class")
+
+    name = f"{socket.gethostname()}-{memory_mb}mb-{uuid4().hex[:8]}"
+    print(f"Worker {name} taking jobs from {', '.join(q.name for q in queues)}")
+    Worker(queues, connection=redis, name=name).work(with_scheduler=True)
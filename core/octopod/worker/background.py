@@ -0,0 +1,86 @@
+import json
+import os
+import random
+import tempfile
+import wave
+from hashlib import sha256
+from io import BytesIO
+from time import time
+from typing import List
+
+import boto3
+from pydub import AudioSegment  # type: ignore
+
+from octopod.audio import AudioSource
+from octopod.cache import DiskCache
+from octopod.config import config
+from octopod.storage import public_url
+
+BACKGROUND_PREFIX = "background/"
+TARGET_LOUDNESS = -32  # dBFS
+TRACK_MS = 30 * 1000  # Longer than any spoken intro
+FADE_OUT_MS = 3000
+
+cache = DiskCache("background", config.BACKGROUND_CACHE_BYTES)
+
+
+def list_tracks() -> List[str]:
+    """List the background tracks in the bucket, refreshing the cached listing on a TTL."""
+    index = os.path.join(config.CACHE_DIR, "background.json")
+    try:
+        if time() - os.path.getmtime(index) < config.BACKGROUND_LISTING_TTL:
+            with open(index) as f:
+                return json.load(f)
+    except FileNotFoundError:
+        pass
+
+    bucket = boto3.resource("s3", endpoint_url=config.AWS_S3_ENDPOINT_URL).Bucket(
+        config.AWS_S3_BUCKET
+    )
+    objects = bucket.objects.filter(Prefix=BACKGROUND_PREFIX)
+    songs = [object.key for object in objects if object.key.endswith(".mp3")]
+
+    os.makedirs(config.CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=config.CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(songs, f)
+        os.replace(tmp, index)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return songs
+
+
+def _fetch_track(key: str) -> str:
+    """Path to the decoded and normalized opening of a track, fetching it on a miss."""
+    cache_key = f"{sha256(key.encode()).hexdigest()}.wav"
+    if path := cache.get(cache_key):
+        return path
+
+    print(f"Caching background track {key}")
+    source = AudioSource.probe(public_url(key))
+    music = source.decode(0, TRACK_MS / 1000)
+    music = music.apply_gain(TARGET_LOUDNESS - music.dBFS)
+
+    buffer = BytesIO()
+    music.export(buffer, format="wav")
+    return cache.put(cache_key, buffer.getvalue())
+
+
+def get_background_music(duration_ms: int) -> AudioSegment:
+    """Returns `duration_ms` of a random background track, normalized and faded out.
+
+    Only the opening of each track is ever used, so that is all we decode and keep on disk.
+    The fade depends on the length of the intro, so it is applied to the slice.
+    """
+    path = _fetch_track(random.choice(list_tracks()))
+    with wave.open(path, "rb") as f:
+        frames = f.readframes(int(f.getframerate() * duration_ms / 1000))
+        music = AudioSegment(
+            data=frames,
+            sample_width=f.getsampwidth(),
+            frame_rate=f.getframerate(),
+            channels=f.getnchannels(),
+        )
+    return music.fade_out(FADE_OUT_MS)
@@ -0,0 +1,494 @@
+"""The podcast processing pipeline as a graph of rq jobs.
+
+    process_podcast (start_podcast)
+      -> transcribe_chunk (one per chunk)   -> plan_extraction
+      -> extract_window (one per window)    -> plan_renders
+      -> render_clip (one per podclip)      -> finalize_podcast
+
+Every fan-out is followed by a join job which depends on all jobs of the fan-out, so a single
+episode is spread across every worker node. Jobs exchange their outputs through `Checkpoints`
+and read the source audio straight from its URL, one range at a time.
+
+Extraction does not wait for the whole transcript: every `transcribe_chunk` enqueues the windows
+whose lines and context are transcribed by then, in order, so podclips are extracted while later
+chunks are still being transcribed. `plan_extraction` only enqueues the last windows, and the
+last `extract_window` to finish enqueues `plan_renders`. Which windows were enqueued and
+extracted is kept in Redis for the run.
+
+Audio which was processed before, under any podcast, is recognized by its input hash, and the
+stages whose outputs were kept as `Artifacts` are skipped.
+
+The whole graph runs in the tier `process_podcast` was enqueued in, and holds one of the
+creator's processing slots from `process_podcast` until `finalize_podcast` or a failure. Every
+job records its resource use as a `ProcessingStage` of the run, which is identified by the job
+id of the `process_podcast` which got the slot. Its work is recorded as `start_podcast`.
+"""
+
+import bisect
+import functools
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from rq import Queue, get_current_job
+from rq.job import Job
+
+from octopod.ai.podclip import (
+    Podclip as ExtractedPodclip,
+    Window,
+    complete_windows,
+    dedup_podclips,
+    embed_podclips,
+    get_creator_name,
+    podclip_intro,
+    title_intro,
+    transcript_to_windows,
+    window_at,
+    window_lines,
+    window_podclips,
+)
+from octopod.ai.transcribe import plan_chunks
+from octopod.ai.transcribe import transcribe_chunk as _transcribe_chunk
+from octopod.ai.transcript import (
+    Segment,
+    Transcript,
+    load_transcript,
+    require_transcript,
+    save_transcript,
+)
+from octopod.audio import AudioSource
+from octopod.checkpoint import Artifacts, Checkpoints, input_hash
+from octopod.metrics import measure
+from octopod.models import PodcastStatus
+from octopod.queue import (
+    SIZE_CLASSES,
+    SizeClass,
+    Tier,
+    acquire_creator_slot,
+    creator_retry_delay,
+    job_attempt,
+    podcast_queue,
+    podcast_retry,
+    queue_classes,
+    redis,
+    release_creator_slot,
+    size_class,
+)
+from octopod.worker.render import RenderJob, render_podclip
+from octopod.worker.tasks import (
+    get_podcast,
+    get_podclip,
+    save_podclips,
+    save_stage_metrics,
+    set_podcast_duration,
+    set_podclip_audio,
+    set_podcast_status,
+)
+
+STAGE_TIMEOUT = 15 * 60  # Seconds, for a single chunk, window or podclip
+RUN_STATE_TTL = 24 * 60 * 60  # Seconds the extraction state of a run is kept in Redis
+
+# Marks window ARGV[1], if any, of a run as extracted. Returns 1 exactly once per run: when the
+# total number of windows is known and all of them are extracted.
+EXTRACTED = redis.register_script(
+    """
+    if ARGV[1] ~= "" then
+        redis.call("SADD", KEYS[2], ARGV[1])
+    end
+    redis.call("EXPIRE", KEYS[2], ARGV[2])
+    local total = redis.call("HGET", KEYS[1], "total")
+    if total and redis.call("SCARD", KEYS[2]) >= tonumber(total)
+        and redis.call("HSETNX", KEYS[1], "joined", 1) == 1 then
+        return 1
+    end
+    return 0
+    """
+)
+
+
+def _run_id() -> str:
+    """Id of the processing run of the current job, carried in the meta of every job."""
+    job = get_current_job()
+    if job is None:
+        return str(uuid4())
+    return job.meta.get("run_id", job.id)
+
+
+def _classes() -> Tuple[Tier, SizeClass]:
+    """Tier and size class of the run of the current job, which the whole graph keeps."""
+    job = get_current_job()
+    if job is None:
+        return Tier.Interactive, SIZE_CLASSES[-1]
+    return queue_classes(job.meta.get("queue", job.origin))
+
+
+def _meta() -> dict:
+    """Meta of the jobs of the run, wherever they are enqueued from."""
+    tier, size = _classes()
+    return {"run_id": _run_id(), "queue": podcast_queue(tier, size).name}
+
+
+def _run_key(name: str) -> str:
+    return f"octopod:run:{_run_id()}:{name}"
+
+
+def enqueue_podcast(podcast_id: UUID, audio_url: str, tier: Tier) -> Job:
+    """Start processing a podcast on the queue for its tier and size class.
+
+    The size class is estimated from a probe of the audio, which takes a moment, so call this
+    from a thread when in an event loop.
+    """
+    size = size_class(audio_url)
+    print(f"Enqueueing podcast {podcast_id} as {tier.value}, {size.name}")
+    return podcast_queue(tier, size).enqueue(
+        process_podcast, podcast_id, job_timeout=size.timeout, retry=podcast_retry
+    )
+
+
+def _fan_out(
+    func: Callable, args: Sequence[tuple], join: Callable, join_args: tuple
+) -> Job:
+    """Enqueue `func` once for every set of `args`, then `join` once they all finish.
+
+    The fanned out jobs each cover a bounded part of the episode, so they go to the smallest
+    size class. The join covers the whole episode, so it stays in the size class of the run.
+    """
+    tier, size = _classes()
+    meta = _meta()
+    jobs = podcast_queue(tier, SIZE_CLASSES[0]).enqueue_many(
+        [
+            Queue.prepare_data(
+                func,
+                args=job_args,
+                timeout=STAGE_TIMEOUT,
+                retry=podcast_retry,
+                meta=meta,
+            )
+            for job_args in args
+        ]
+    )
+    return podcast_queue(tier, size).enqueue(
+        join,
+        *join_args,
+        depends_on=jobs,
+        job_timeout=size.timeout,
+        retry=podcast_retry,
+        meta=meta,
+    )
+
+
+def measured(func: Callable) -> Callable:
+    """Record the resource use of every attempt at a job as a stage of its run."""
+
+    @functools.wraps(func)
+    async def wrapper(podcast_id: UUID, *args: Any) -> Any:
+        job = get_current_job()
+        try:
+            with measure(func.__name__) as metrics:
+                return await func(podcast_id, *args)
+        finally:
+            await save_stage_metrics(podcast_id, _run_id(), job_attempt(job), [metrics])
+
+    return wrapper
+
+
+def fails_podcast(func: Callable) -> Callable:
+    """Mark the podcast as errored once the job is out of retries."""
+
+    @functools.wraps(func)
+    async def wrapper(podcast_id: UUID, *args: Any) -> Any:
+        try:
+            return await func(podcast_id, *args)
+        except Exception as e:
+            print(e)
+            job = get_current_job()
+            if job is None or not job.retries_left:
+                podcast = await set_podcast_status(podcast_id, PodcastStatus.Error)
+                release_creator_slot(podcast.creator_id, podcast_id)
+            raise
+
+    return wrapper
+
+
+def stage(func: Callable) -> Callable:
+    """Wrap a job of the pipeline.
+
+    The resource use of every attempt is recorded, and the podcast is marked as errored once
+    the job is out of retries.
+    """
+    return fails_podcast(measured(func))
+
+
+@fails_podcast
+async def process_podcast(podcast_id: UUID):
+    """Entry point of the pipeline.
+
+    When the creator already has CREATOR_MAX_INFLIGHT podcasts processing, the podcast goes
+    back on the queue for later, so other creators' podcasts go first. Deferring is not a stage
+    of any run, so it is not recorded.
+    """
+    podcast = await get_podcast(podcast_id)
+    if not acquire_creator_slot(podcast.creator_id, podcast_id):
+        print(f"Deferring podcast {podcast_id}, creator is at capacity")
+        tier, size = _classes()
+        podcast_queue(tier, size).enqueue_in(
+            creator_retry_delay(),
+            process_podcast,
+            podcast_id,
+            job_timeout=size.timeout,
+            retry=podcast_retry,
+        )
+        return
+    await start_podcast(podcast_id)
+
+
+@stage
+async def start_podcast(podcast_id: UUID):
+    """Probe the audio and fan out transcription, once the podcast holds a creator slot."""
+    podcast = await set_podcast_status(podcast_id, PodcastStatus.Processing)
+    source = AudioSource.probe(podcast.audio_url)
+    await set_podcast_duration(podcast_id, source.duration)
+
+    digest = input_hash(podcast.audio_url)
+    artifacts = Artifacts(digest)
+    podclips = artifacts.load("podclips")
+    if podclips is not None:
+        print(f"Reusing the podclips of identical audio {digest}")
+        await _render(podcast_id, digest, podcast.audio_url, podclips)
+        return
+    transcript = load_transcript(artifacts, "transcript")
+    if transcript is not None:
+        print(f"Reusing the transcript of identical audio {digest}")
+        _extract(podcast_id, digest, podcast.audio_url, transcript)
+        return
+
+    checkpoints = Checkpoints(podcast_id, digest)
+    chunks = checkpoints.load("chunks")
+    if chunks is None:
+        chunks = plan_chunks(source)
+        checkpoints.save("chunks", chunks)
+    _fan_out(
+        transcribe_chunk,
+        [(podcast_id, digest, podcast.audio_url, i) for i in range(len(chunks))],
+        plan_extraction,
+        (podcast_id, digest, podcast.audio_url, len(chunks)),
+    )
+
+
+@stage
+async def transcribe_chunk(podcast_id: UUID, digest: str, audio_url: str, index: int):
+    source = AudioSource.probe(audio_url)
+    checkpoints = Checkpoints(podcast_id, digest)
+    chunks = checkpoints.require("chunks")
+    start, end = chunks[index]
+    segments = _transcribe_chunk(source, (start, end), index, checkpoints)
+    _record_lines({index: len(segments)})
+    _enqueue_windows(podcast_id, digest, audio_url, len(chunks))
+
+
+@stage
+async def plan_extraction(podcast_id: UUID, digest: str, audio_url: str, chunks: int):
+    """Join the transcript and enqueue the windows at its end."""
+    checkpoints = Checkpoints(podcast_id, digest)
+    transcripts = [_chunk_transcript(checkpoints, i) for i in range(chunks)]
+    save_transcript(Artifacts(digest), "transcript", Transcript.concat(transcripts))
+    # Every chunk recorded its lines already, unless the state of the run expired.
+    _record_lines({i: len(transcript) for i, transcript in enumerate(transcripts)})
+    _enqueue_windows(podcast_id, digest, audio_url, chunks)
+
+
+def _chunk_transcript(checkpoints: Checkpoints, index: int) -> Transcript:
+    return Transcript.from_segments(
+        Segment(**segment) for segment in checkpoints.require(f"transcript/{index}")
+    )
+
+
+def _record_lines(lines: Dict[int, int]):
+    """Record how many lines of the transcript transcribed chunks hold."""
+    key = _run_key("lines")
+    redis.hset(key, mapping={str(i): n for i, n in lines.items()})
+    redis.expire(key, RUN_STATE_TTL)
+
+
+def _enqueue_windows(podcast_id: UUID, digest: str, audio_url: str, chunks: int):
+    """Enqueue the windows which are complete in the chunks transcribed so far.
+
+    Chunks are transcribed out of order, so only the chunks up to the first one which is not
+    transcribed yet count. The position of a window in the transcript follows from the number
+    of lines of the chunks before it, so only the chunks which it overlaps are loaded.
+    """
+    checkpoints = Checkpoints(podcast_id, digest)
+    state = _run_key("extraction")
+    with redis.lock(_run_key("windows"), timeout=STAGE_TIMEOUT):
+        lines = {int(i): int(n) for i, n in redis.hgetall(_run_key("lines")).items()}
+        offsets = [0]  # Of the transcribed prefix of chunks, and past its last line
+        while len(offsets) - 1 in lines:
+            offsets.append(offsets[-1] + lines[len(offsets) - 1])
+        finished = len(offsets) - 1 == chunks
+        enqueued = int(redis.hget(state, "enqueued") or 0)
+        ready = complete_windows(offsets[-1], finished)
+
+        transcripts: Dict[int, Transcript] = {}
+        for index in range(enqueued, ready):
+            needed = window_lines(index)
+            first = bisect.bisect_right(offsets, needed.start) - 1
+            last = bisect.bisect_left(offsets, min(needed.stop, offsets[-1]))
+            for i in range(first, last):
+                if i not in transcripts:
+                    transcripts[i] = _chunk_transcript(checkpoints, i)
+            part = Transcript.concat(transcripts[i] for i in range(first, last))
+            window = window_at(part, index, offsets[first])
+            _enqueue_window(podcast_id, digest, audio_url, index, window)
+
+        redis.hset(state, "enqueued", ready)
+        if finished:
+            redis.hset(state, "total", ready)
+        redis.expire(state, RUN_STATE_TTL)
+    if finished:
+        _join_windows(podcast_id, digest, audio_url, None)
+
+
+def _extract(podcast_id: UUID, digest: str, audio_url: str, transcript: Transcript):
+    """Enqueue every window of a transcript which is complete already."""
+    windows = transcript_to_windows(transcript)
+    for index, window in enumerate(windows):
+        _enqueue_window(podcast_id, digest, audio_url, index, window)
+    state = _run_key("extraction")
+    redis.hset(state, mapping={"enqueued": len(windows), "total": len(windows)})
+    redis.expire(state, RUN_STATE_TTL)
+    _join_windows(podcast_id, digest, audio_url, None)
+
+
+def _enqueue_window(
+    podcast_id: UUID, digest: str, audio_url: str, index: int, window: Window
+):
+    save_transcript(Checkpoints(podcast_id, digest), f"windows/{index}", window.context)
+    tier, _ = _classes()
+    podcast_queue(tier, SIZE_CLASSES[0]).enqueue(
+        extract_window,
+        podcast_id,
+        digest,
+        audio_url,
+        index,
+        window.first,
+        window.last,
+        job_timeout=STAGE_TIMEOUT,
+        retry=podcast_retry,
+        meta=_meta(),
+    )
+
+
+def _join_windows(podcast_id: UUID, digest: str, audio_url: str, index: Optional[int]):
+    """Mark a window as extracted, and enqueue `plan_renders` once every window is."""
+    state = _run_key("extraction")
+    keys = [state, _run_key("extracted")]
+    if not EXTRACTED(keys=keys, args=["" if index is None else index, RUN_STATE_TTL]):
+        return
+    tier, size = _classes()
+    podcast_queue(tier, size).enqueue(
+        plan_renders,
+        podcast_id,
+        digest,
+        audio_url,
+        int(redis.hget(state, "total") or 0),
+        job_timeout=size.timeout,
+        retry=podcast_retry,
+        meta=_meta(),
+    )
+
+
+@stage
+async def extract_window(
+    podcast_id: UUID, digest: str, audio_url: str, index: int, first: int, last: int
+):
+    checkpoints = Checkpoints(podcast_id, digest)
+    context = require_transcript(checkpoints, f"windows/{index}")
+    await window_podclips(Window(context, first, last), index, checkpoints)
+    _join_windows(podcast_id, digest, audio_url, index)
+
+
+@stage
+async def plan_renders(podcast_id: UUID, digest: str, audio_url: str, windows: int):
+    """Join the extracted podclips, embed them in batches, drop duplicates and fan out
+    rendering."""
+    checkpoints = Checkpoints(podcast_id, digest)
+    extracted: List[ExtractedPodclip] = []
+    for i in range(windows):
+        extracted.extend(
+            ExtractedPodclip(**podclip)
+            for podclip in checkpoints.require(f"podclips/{i}")
+        )
+    podclips = [
+        asdict(podclip) for podclip in dedup_podclips(await embed_podclips(extracted))
+    ]
+    Artifacts(digest).save("podclips", podclips)
+    await _render(podcast_id, digest, audio_url, podclips)
+
+
+async def _render(podcast_id: UUID, digest: str, audio_url: str, podclips: List[dict]):
+    """Fan out rendering, unless identical audio was already rendered for the creator."""
+    Checkpoints(podcast_id, digest).save("podclips", podclips)
+    creator = await get_creator_name(podcast_id)
+    renders = Artifacts(digest).load(Artifacts.renders_name(creator))
+    if renders is not None and len(renders) == len(podclips):
+        print(f"Reusing the renders of identical audio {digest}")
+        await _finish(podcast_id, digest, renders)
+        return
+
+    _fan_out(
+        render_clip,
+        [(podcast_id, digest, audio_url, creator, i) for i in range(len(podclips))],
+        finalize_podcast,
+        (podcast_id, digest, creator),
+    )
+
+
+@stage
+async def render_clip(
+    podcast_id: UUID, digest: str, audio_url: str, creator: str, index: int
+):
+    checkpoints = Checkpoints(podcast_id, digest)
+    if checkpoints.load(f"render/{index}") is not None:
+        return
+    podclip = ExtractedPodclip(**checkpoints.require("podclips")[index])
+    job = RenderJob(
+        podclip.start_time, podclip.end_time, podclip_intro(podclip, creator)
+    )
+    render_podclip(AudioSource.probe(audio_url), job, index, checkpoints)
+
+
+@stage
+async def finalize_podcast(podcast_id: UUID, digest: str, creator: str):
+    """Store every rendered podclip and mark the podcast as ready."""
+    checkpoints = Checkpoints(podcast_id, digest)
+    podclips = checkpoints.require("podclips")
+    audio_urls = [checkpoints.require(f"render/{i}") for i in range(len(podclips))]
+    Artifacts(digest).save(Artifacts.renders_name(creator), audio_urls)
+    await _finish(podcast_id, digest, audio_urls)
+
+
+async def _finish(podcast_id: UUID, digest: str, audio_urls: List[str]):
+    checkpoints = Checkpoints(podcast_id, digest)
+    podclips = [
+        ExtractedPodclip(**podclip) for podclip in checkpoints.require("podclips")
+    ]
+    await save_podclips(podcast_id, podclips, audio_urls)
+    checkpoints.clear()
+    podcast = await get_podcast(podcast_id)
+    release_creator_slot(podcast.creator_id, podcast_id)
+
+
+@measured
+async def rerender_podclip(podcast_id: UUID, podclip_id: UUID):
+    """Render a single podclip again after its title or boundaries were edited.
+
+    This runs outside of the graph above. The transcript and embedding of the podclip are left
+    untouched, and since speech is cached by content, only a new title is synthesized again.
+    """
+    podcast = await get_podcast(podcast_id)
+    podclip = await get_podclip(podclip_id)
+    intro = title_intro(podclip.title, await get_creator_name(podcast_id))
+    job = RenderJob(podclip.start_time, podclip.end_time, intro)
+    audio_url = render_podclip(AudioSource.probe(podcast.audio_url), job)
+    if not await set_podclip_audio(podclip, audio_url):
+        print(f"Podclip {podclip_id} was edited while rendering, dropping {audio_url}")
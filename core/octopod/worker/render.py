@@ -0,0 +1,112 @@
+import subprocess
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+from uuid import uuid4
+
+from pydub import AudioSegment  # type: ignore
+
+from octopod.audio import AudioSource
+from octopod.checkpoint import Checkpoints
+from octopod.storage import upload_bytes
+from octopod.worker.background import get_background_music
+
+INTRO_PAUSE_MS = 2000
+FADE_IN_SECONDS = 2
+FADE_OUT_SECONDS = 5
+
+
+@dataclass
+class RenderJob:
+    start_time: float
+    end_time: float
+    intro: AudioSegment  # Spoken intro, without background music
+
+
+def render_intro(speech: AudioSegment) -> AudioSegment:
+    """Lay the spoken intro, followed by a short pause, over background music."""
+    intro = speech + AudioSegment.silent(duration=INTRO_PAUSE_MS)
+    return intro.overlay(get_background_music(len(intro)))
+
+
+def cut_podclip(
+    source: AudioSource,
+    start_time: float,
+    end_time: float,
+    intro: AudioSegment,
+) -> bytes:
+    """Cut a podclip out of the source, join it to its intro and encode it as MP3 in memory.
+
+    ffmpeg seeks in the source and decodes only the requested range, which is accurate to the
+    sample because the range is re-encoded. The source is never decoded in full.
+    """
+    intro_wav = BytesIO()
+    intro.export(intro_wav, format="wav")
+
+    duration = end_time - start_time
+    fade_out_at = max(0.0, len(intro) / 1000 + duration - FADE_OUT_SECONDS)
+    layout = "mono" if source.channels == 1 else "stereo"
+    audio_format = f"aformat=sample_rates={source.frame_rate}:channel_layouts={layout}"
+    filters = ";".join(
+        [
+            f"[0:a]{audio_format}[intro]",
+            f"[1:a]{audio_format},afade=t=in:d={FADE_IN_SECONDS}[clip]",
+            "[intro][clip]concat=n=2:v=0:a=1,"
+            f"afade=t=out:st={fade_out_at:.3f}:d={FADE_OUT_SECONDS}[out]",
+        ]
+    )
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            "-f",
+            "wav",
+            "-i",
+            "pipe:0",
+            "-ss",
+            f"{start_time:.3f}",
+            "-t",
+            f"{duration:.3f}",
+            "-i",
+            source.path,
+            "-filter_complex",
+            filters,
+            "-map",
+            "[out]",
+            "-f",
+            "mp3",
+            "pipe:1",
+        ],
+        input=intro_wav.getvalue(),
+        capture_output=True,
+        check=True,
+    )
+    source.count_read(duration)
+    return result.stdout
+
+
+def render_podclip_audio(source: AudioSource, job: RenderJob) -> bytes:
+    """Render a single podclip as MP3 bytes."""
+    return cut_podclip(source, job.start_time, job.end_time, render_intro(job.intro))
+
+
+def podclip_key() -> str:
+    return f"{uuid4()}.mp3"
+
+
+def render_podclip(
+    source: AudioSource,
+    job: RenderJob,
+    index: int = 0,
+    checkpoints: Optional[Checkpoints] = None,
+) -> str:
+    """Render a single podclip, upload it and return its URL."""
+    audio_url = upload_bytes(
+        render_podclip_audio(source, job), podclip_key(), "audio/mpeg"
+    )
+    print(audio_url)
+    if checkpoints is not None:
+        checkpoints.save(f"render/{index}", audio_url)
+    return audio_url
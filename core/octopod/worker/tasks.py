@@ -1,47 +1,52 @@
-from uuid import UUID, uuid4
-import requests
-import tempfile
-import random
+from dataclasses import asdict
+from typing import List
+from uuid import UUID
 
-import boto3
-from tqdm import tqdm
-from pydub import AudioSegment  # type: ignore
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, insert, update
 
-from octopod.config import config
 from octopod.database import SessionLocal
-from octopod.models import Podcast, PodcastStatus, Podclip
-from octopod.ai import extract_podclips
-from octopod.ai.podclip import podclip_intro
+from octopod.metrics import StageMetrics
+from octopod.models import Podcast, PodcastStatus, Podclip, ProcessingStage
+from octopod.ai.podclip import Podclip as ExtractedPodclip
 
 
-def download_mp3(url: str) -> str:
-    # Send a GET request to download the file
-    response = requests.get(url, stream=True)
-    response.raise_for_status()  # Raise an exception for bad responses
-
-    # Create a temporary file
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-        # Write the content to the temporary file
-        for chunk in tqdm(response.iter_content(chunk_size=1_048_576)):
-            temp_file.write(chunk)
-
-        # Return the path of the temporary file
-        return temp_file.name
-
-
-def get_background_music() -> AudioSegment:
-    s3 = boto3.resource("s3")
-    bucket = s3.Bucket(config.AWS_S3_BUCKET)
-    objects = bucket.objects.filter(Prefix="background/")
-
-    songs = [object.key for object in objects if object.key.endswith(".mp3")]
+async def get_podcast(podcast_id: UUID) -> Podcast:
+    async with SessionLocal() as session:
+        result = await session.execute(select(Podcast).where(Podcast.id == podcast_id))
+        podcast = result.scalar()
+        if not podcast:
+            raise ValueError(f"Podcast with id {podcast_id} not found")
+    return podcast
 
-    song = random.choice(songs)
 
-    return AudioSegment.from_file(
-        download_mp3(f"https://{config.AWS_S3_BUCKET}.s3.amazonaws.com/{song}")
-    )
+async def get_podclip(podclip_id: UUID) -> Podclip:
+    async with SessionLocal() as session:
+        result = await session.execute(select(Podclip).where(Podclip.id == podclip_id))
+        podclip = result.scalar()
+        if not podclip:
+            raise ValueError(f"Podclip with id {podclip_id} not found")
+    return podclip
+
+
+async def set_podclip_audio(podclip: Podclip, audio_url: str) -> bool:
+    """Point a podclip at newly rendered audio, unless it was edited since it was loaded.
+
+    Returns whether the podclip was updated. An edit enqueues a render of its own, so audio for
+    an outdated title or outdated boundaries is simply dropped.
+    """
+    async with SessionLocal() as session, session.begin():
+        updated = await session.scalar(
+            update(Podclip)
+            .where(
+                Podclip.id == podclip.id,
+                Podclip.title == podclip.title,
+                Podclip.start_time == podclip.start_time,
+                Podclip.end_time == podclip.end_time,
+            )
+            .values(audio_url=audio_url)
+            .returning(Podclip.id)
+        )
+    return updated is not None
 
 
 async def set_podcast_status(podcast_id: UUID, status: PodcastStatus) -> Podcast:
@@ -68,56 +73,22 @@ async def set_podcast_duration(podcast_id: UUID, duration: float) -> Podcast:
     return podcast
 
 
-async def handle_podcast(podcast_id: UUID):
-    async with SessionLocal() as session:
-        # Drop existing podclips
-        await session.execute(delete(Podclip).where(Podclip.podcast_id == podcast_id))
+async def save_podclips(
+    podcast_id: UUID, podclips: List[ExtractedPodclip], audio_urls: List[str]
+) -> List[UUID]:
+    """Replace the podclips of a podcast and mark it as ready in a single transaction.
 
-    podcast = await set_podcast_status(podcast_id, PodcastStatus.Processing)
-
-    path_to_mp3 = download_mp3(podcast.audio_url)
-    audio = AudioSegment.from_file(path_to_mp3)
-    podcast = await set_podcast_duration(
-        podcast_id, len(audio) / 1000
-    )  # Duration in seconds
-
-    try:
-        podclips = extract_podclips(audio)
-        for podclip in podclips:
-            async with SessionLocal() as session:
-                intro_text = await podclip_intro(podclip, podcast_id)
-            intro_text += AudioSegment.silent(duration=2000)
-            intro_length = len(intro_text)
-
-            intro_music = get_background_music()[:intro_length]
-
-            target_loudness = -32
-            intro_music = intro_music.apply_gain(target_loudness - intro_music.dBFS)
-            intro_music = intro_music.fade_out(3000)
-
-            intro = intro_text.overlay(intro_music)
-            sound = audio[
-                int(podclip.start_time * 1000) : int(podclip.end_time * 1000)
-            ].fade_in(2000)
-            sound = intro + sound
-            sound = sound.fade_out(5000)
-
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                sound.export(temp_file.name, format="mp3")
-
-                key = f"{uuid4()}.mp3"
-                boto3.client("s3").upload_file(
-                    temp_file.name,
-                    config.AWS_S3_BUCKET,
-                    key,
-                )
-
-                audio_url = f"https://{config.AWS_S3_BUCKET}.s3.amazonaws.com/{key}"
-                print(audio_url)
-
-            async with SessionLocal() as session:
-                session.add(
-                    Podclip(
+    Readers either see the previous set of podclips or the complete new one, never a partially
+    written list.
+    """
+    async with SessionLocal() as session, session.begin():
+        await session.execute(delete(Podclip).where(Podclip.podcast_id == podcast_id))
+        ids: List[UUID] = []
+        if podclips:
+            result = await session.scalars(
+                insert(Podclip).returning(Podclip.id),
+                [
+                    dict(
                         podcast_id=podcast_id,
                         title=podclip.title,
                         description=podclip.description,
@@ -127,16 +98,26 @@ async def handle_podcast(podcast_id: UUID):
                         end_time=podclip.end_time,
                         embedding=podclip.embedding,
                     )
-                )
-                await session.commit()
-    except Exception as e:
-        print(e)
-        await set_podcast_status(podcast_id, PodcastStatus.Error)
-
-    await set_podcast_status(podcast_id, PodcastStatus.Ready)
-
-
-if __name__ == "__main__":
-    import asyncio
-
-    asyncio.run(handle_podcast(UUID("0191c5b2-0041-3e9b-a103-b5ba127bd715")))
+                    for podclip, audio_url in zip(podclips, audio_urls)
+                ],
+            )
+            ids = list(result.all())
+        await session.execute(
+            update(Podcast)
+            .where(Podcast.id == podcast_id)
+            .values(status=PodcastStatus.Ready)
+        )
+    return ids
+
+
+async def save_stage_metrics(
+    podcast_id: UUID, run_id: str, attempt: int, stages: List[StageMetrics]
+):
+    """Record the resource use of the stages of a processing run."""
+    async with SessionLocal() as session, session.begin():
+        session.add_all(
+            ProcessingStage(
+                podcast_id=podcast_id, run_id=run_id, attempt=attempt, **asdict(metrics)
+            )
+            for metrics in stages
+        )
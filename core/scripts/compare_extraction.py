@@ -0,0 +1,123 @@
+"""Compare the extraction modes on the transcript of a processed podcast.
+
+Every window of the transcript is extracted in both the "two_phase" and the "single_call"
+EXTRACTION_MODE. The script reports the tokens and latency per window of each mode, and how well
+the podclips of the single call agree with those of the two phases, by the overlap of their time
+ranges. Nothing is checkpointed or saved, and responses are neither taken from nor added to the
+response cache.
+
+    PYTHONPATH=. python scripts/compare_extraction.py <podcast id>
+"""
+
+import asyncio
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from statistics import mean
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+from octopod.ai import responses
+from octopod.ai.podclip import Podclip, transcript_to_windows, window_podclips
+from octopod.ai.transcript import require_transcript
+from octopod.checkpoint import Artifacts, input_hash
+from octopod.config import config
+from octopod.database import SessionLocal
+from octopod.models import Podcast
+
+MODES = ["two_phase", "single_call"]
+AGREEMENT_IOU = 0.5  # Podclips which overlap at least this much are the same podclip
+
+_usage: ContextVar[Dict[str, int]] = ContextVar("usage")
+_limited_async = responses.limited_async
+
+
+async def _counting_limited_async(*args, **kwargs):
+    """Count the tokens of every chat request towards the window being extracted."""
+    response = await _limited_async(*args, **kwargs)
+    usage = _usage.get()
+    usage["prompt"] += response.usage.prompt_tokens
+    usage["completion"] += response.usage.completion_tokens
+    usage["requests"] += 1
+    return response
+
+
+@dataclass
+class WindowResult:
+    podclips: List[Podclip]
+    seconds: float
+    usage: Dict[str, int] = field(default_factory=dict)
+
+
+async def _extract(window, index: int) -> WindowResult:
+    usage = {"prompt": 0, "completion": 0, "requests": 0}
+    _usage.set(usage)
+    start = time.perf_counter()
+    podclips = await window_podclips(window, index)
+    return WindowResult(podclips, time.perf_counter() - start, usage)
+
+
+def iou(a: Podclip, b: Podclip) -> float:
+    """Intersection over union of the time ranges of two podclips."""
+    overlap = min(a.end_time, b.end_time) - max(a.start_time, b.start_time)
+    union = max(a.end_time, b.end_time) - min(a.start_time, b.start_time)
+    return max(0.0, overlap) / union if union > 0 else 0.0
+
+
+def agreement(
+    reference: List[Podclip], candidate: List[Podclip]
+) -> Tuple[float, float, float]:
+    """Mean best overlap of the reference podclips, and the recall and precision at
+    AGREEMENT_IOU of the candidate podclips."""
+    if not reference or not candidate:
+        return 0.0, float(not reference), float(not candidate)
+    best = [max(iou(r, c) for c in candidate) for r in reference]
+    matched = [max(iou(c, r) for r in reference) for c in candidate]
+    return (
+        mean(best),
+        sum(b >= AGREEMENT_IOU for b in best) / len(best),
+        sum(m >= AGREEMENT_IOU for m in matched) / len(matched),
+    )
+
+
+async def main(podcast_id: UUID):
+    async with SessionLocal() as session:
+        podcast = await session.get(Podcast, podcast_id)
+        if podcast is None:
+            raise ValueError(f"Podcast with id {podcast_id} not found")
+    transcript = require_transcript(
+        Artifacts(input_hash(podcast.audio_url)), "transcript"
+    )
+    windows = transcript_to_windows(transcript)
+    print(f"Comparing extraction modes on {len(windows)} windows")
+
+    config.LLM_CACHE_BACKEND = "none"
+    responses.limited_async = _counting_limited_async
+    results: Dict[str, List[WindowResult]] = {}
+    for mode in MODES:
+        config.EXTRACTION_MODE = mode  # type: ignore
+        results[mode] = list(
+            await asyncio.gather(*(_extract(w, i) for i, w in enumerate(windows)))
+        )
+
+    for mode, mode_results in results.items():
+        tokens = [r.usage["prompt"] + r.usage["completion"] for r in mode_results]
+        print(
+            f"{mode}: {sum(len(r.podclips) for r in mode_results)} podclips, "
+            f"{sum(r.usage['requests'] for r in mode_results)} requests, "
+            f"{mean(tokens):.0f} tokens and "
+            f"{mean(r.seconds for r in mode_results):.1f}s per window"
+        )
+
+    reference = [p for r in results["two_phase"] for p in r.podclips]
+    candidate = [p for r in results["single_call"] for p in r.podclips]
+    overlap, recall, precision = agreement(reference, candidate)
+    print(
+        f"Agreement: mean overlap {overlap:.2f}, recall {recall:.2f} and "
+        f"precision {precision:.2f} at {AGREEMENT_IOU} overlap"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(UUID(sys.argv[1])))
@@ -0,0 +1,46 @@
+"""Re-embed the description of every podclip, for example after changing the embedding model.
+
+Podclips are read in pages of PAGE_SIZE by id, embedded in batches and updated in place, so the
+backfill can be stopped and resumed from the last id it printed.
+"""
+
+import sys
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select, update
+
+from octopod.ai.embeddings import embed
+from octopod.database import SessionLocal
+from octopod.models import Podclip
+
+PAGE_SIZE = 1000
+
+
+async def main(after: Optional[UUID] = None):
+    total = 0
+    while True:
+        async with SessionLocal() as session, session.begin():
+            query = select(Podclip.id, Podclip.description).order_by(Podclip.id)
+            if after is not None:
+                query = query.where(Podclip.id > after)
+            page = (await session.execute(query.limit(PAGE_SIZE))).all()
+            if not page:
+                break
+            embeddings = await embed([description for _, description in page])
+            await session.execute(
+                update(Podclip),
+                [
+                    {"id": podclip_id, "embedding": embedding}
+                    for (podclip_id, _), embedding in zip(page, embeddings)
+                ],
+            )
+        total += len(page)
+        after = page[-1][0]
+        print(f"Embedded {total} podclips, up to {after}")
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    asyncio.run(main(UUID(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -1,15 +1,26 @@
 from uuid import UUID
-from octopod.queue import worker_queue
-from octopod.worker import tasks
+from octopod.database import SessionLocal
+from octopod.models import Podcast
+from octopod.queue import Tier
+from octopod.worker import pipeline
+
+PODCAST_IDS = [
+    UUID("0191ebf3-fe2a-19ff-d817-06e94e80b74d"),
+    UUID("0191ebfc-586f-6843-b3e9-0f5af91428d5"),
+]
+
+
+async def main():
+    # Reruns of podcasts which were already processed.
+    async with SessionLocal() as session:
+        for podcast_id in PODCAST_IDS:
+            podcast = await session.get(Podcast, podcast_id)
+            if podcast is None:
+                raise ValueError(f"Podcast with id {podcast_id} not found")
+            pipeline.enqueue_podcast(podcast_id, podcast.audio_url, Tier.Reprocess)
+
 
 if __name__ == "__main__":
-    worker_queue.enqueue(
-        tasks.handle_podcast,
-        UUID("0191ebf3-fe2a-19ff-d817-06e94e80b74d"),
-        job_timeout=3600,
-    )
-    worker_queue.enqueue(
-        tasks.handle_podcast,
-        UUID("0191ebfc-586f-6843-b3e9-0f5af91428d5"),
-        job_timeout=3600,
-    )
+    import asyncio
+
+    asyncio.run(main())
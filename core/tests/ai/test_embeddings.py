@@ -0,0 +1,36 @@
+import pytest
+
+from octopod.ai import embeddings
+from octopod.config import config
+
+
+def test_batches_fit_the_input_and_token_limits(monkeypatch):
+    monkeypatch.setattr(embeddings, "MAX_BATCH_INPUTS", 3)
+    monkeypatch.setattr(embeddings, "MAX_BATCH_TOKENS", 100)
+    texts = ["a" * 40] * 7 + ["b" * 360] + ["c" * 4000]
+
+    assert embeddings.batches(texts) == [
+        range(0, 3),
+        range(3, 6),
+        range(6, 7),
+        range(7, 8),  # 91 tokens, which do not fit next to the 11 before
+        range(8, 9),  # Too large for any batch, so on its own
+    ]
+    assert embeddings.batches([]) == []
+
+
+@pytest.mark.asyncio
+async def test_embeds_every_batch_in_order(monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_BACKEND", "none")
+    monkeypatch.setattr(embeddings, "MAX_BATCH_INPUTS", 2)
+    requests = []
+
+    async def embed_batch(texts):
+        requests.append(list(texts))
+        return [[float(text)] for text in texts]
+
+    monkeypatch.setattr(embeddings, "_embed_batch", embed_batch)
+
+    texts = [str(i) for i in range(5)]
+    assert await embeddings.embed(texts) == [[0.0], [1.0], [2.0], [3.0], [4.0]]
+    assert requests == [["0", "1"], ["2", "3"], ["4"]]
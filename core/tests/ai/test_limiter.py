@@ -0,0 +1,157 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from octopod.ai import limiter
+from octopod.config import config
+from octopod.metrics import measure
+
+
+class FakeResponse:
+    def __init__(self, remaining: int):
+        self.headers = httpx.Headers(
+            {
+                "x-ratelimit-limit-requests": "100",
+                "x-ratelimit-remaining-requests": str(remaining),
+            }
+        )
+
+    def parse(self):
+        return "parsed"
+
+
+def rate_limit_error() -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request)
+    return openai.RateLimitError("Rate limited", response=response, body=None)  # type: ignore
+
+
+@pytest.fixture(autouse=True)
+def unlimited(monkeypatch):
+    monkeypatch.setattr(config, "OPENAI_RATE_LIMITS", {})
+    monkeypatch.setattr(limiter, "_concurrency", {})
+    monkeypatch.setattr(limiter.time, "sleep", lambda seconds: None)
+
+
+def test_concurrency_grows_additively_and_halves():
+    slots = limiter.AdaptiveConcurrency(4, max_limit=16)
+    for _ in range(4):
+        slots.increase()
+    assert int(slots.limit) == 4  # One more only after a limit's worth of successes
+    slots.increase()
+    assert int(slots.limit) == 5
+    slots.decrease()
+    assert slots.limit < 3
+    for _ in range(10):
+        slots.decrease()
+    assert slots.limit == 1
+
+
+def test_retries_rate_limited_requests_and_backs_off():
+    responses = [rate_limit_error(), rate_limit_error(), FakeResponse(remaining=50)]
+
+    def create(**kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    with measure("extract") as metrics:
+        assert limiter.limited(create, model="gpt-4o-mini") == "parsed"
+    assert metrics.api_calls == 1
+    assert metrics.api_retries == 2
+    assert limiter.concurrency("gpt-4o-mini").limit < config.OPENAI_INITIAL_CONCURRENCY
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(config, "OPENAI_MAX_RETRIES", 2)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        raise rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        limiter.limited(create, model="gpt-4o-mini")
+    assert len(calls) == 3
+
+
+def test_nearly_exhausted_limits_shrink_concurrency():
+    limiter.limited(lambda **kwargs: FakeResponse(remaining=5), model="tts-1")
+    assert limiter.concurrency("tts-1").limit == config.OPENAI_INITIAL_CONCURRENCY / 2
+
+
+def test_backoff_is_jittered_and_respects_retry_after():
+    delays = {limiter.backoff(3) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert limiter.backoff(0, retry_after=30) == 30
+
+
+@pytest.mark.asyncio
+async def test_async_requests_share_the_limit_of_the_event_loop():
+    in_flight, peak = 0, 0
+
+    class Raw:
+        headers = httpx.Headers()
+
+        def parse(self):
+            return "parsed"
+
+    async def create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return Raw()
+
+    results = await asyncio.gather(
+        *(limiter.limited_async(create, model="gpt-4o-mini") for _ in range(20))
+    )
+    assert results == ["parsed"] * 20
+    # Requests in flight start at the initial limit and grow as requests succeed.
+    assert config.OPENAI_INITIAL_CONCURRENCY < peak <= config.OPENAI_MAX_CONCURRENCY
+
+
+def test_rate_limits_are_taken_only_within_a_slot(monkeypatch):
+    active = []
+    monkeypatch.setattr(
+        limiter,
+        "take",
+        lambda model, tokens: active.append(limiter.concurrency(model).active),
+    )
+    limiter.limited(lambda **kwargs: FakeResponse(remaining=50), model="tts-1")
+    assert active == [1]
+
+
+@pytest.mark.asyncio
+async def test_async_requests_wait_for_rate_limits_on_the_event_loop(monkeypatch):
+    monkeypatch.setattr(config, "OPENAI_RATE_LIMITS", {"gpt-4o-mini": (500, 0)})
+    waits = [0.01, 0.01, 0.0]
+    slots = limiter.async_concurrency("gpt-4o-mini")
+    active = []
+
+    def try_take(model, tokens):
+        active.append(slots.active)
+        return waits.pop(0)
+
+    def sleep(seconds):
+        raise AssertionError("Blocked a thread while rate limited")
+
+    monkeypatch.setattr(limiter, "_try_take", try_take)
+    monkeypatch.setattr(limiter.time, "sleep", sleep)
+
+    class Raw:
+        headers = httpx.Headers()
+
+        def parse(self):
+            return "parsed"
+
+    async def create(**kwargs):
+        return Raw()
+
+    assert await limiter.limited_async(create, model="gpt-4o-mini") == "parsed"
+    assert active == [1, 1, 1]
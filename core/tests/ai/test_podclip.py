@@ -0,0 +1,190 @@
+import asyncio
+import json
+from uuid import uuid4
+
+import pytest
+
+from octopod.ai import podclip as ai
+from octopod.ai.transcript import Segment, Transcript
+from octopod.checkpoint import Checkpoints
+from octopod.config import config
+
+
+class MemoryCheckpoints(Checkpoints):
+    def __init__(self):
+        super().__init__(uuid4(), "test")
+        self.saved = {}
+
+    def load(self, name):
+        return self.saved.get(name)
+
+    def save(self, name, data):
+        self.saved[name] = data
+
+
+@pytest.mark.asyncio
+async def test_transcript_to_podclips_resumes_from_checkpoints(monkeypatch):
+    segments = [
+        Segment(start_time=i * 10.0, end_time=i * 10.0 + 10, text=f"line {i}")
+        for i in range(150)
+    ]
+    transcript = Transcript.from_segments(segments)
+    calls = []
+
+    async def topics(window):
+        calls.append("topics")
+        return [ai.Topic("Topic", "Description")]
+
+    async def podclip(window, topic):
+        calls.append("podclip")
+        lines = window.lines
+        return ai.Podclip(
+            topic.title, topic.description, lines.starts[0], lines.ends[-1], "", []
+        )
+
+    async def embed(texts):
+        calls.append(f"embed {len(texts)}")
+        return [[1.0] for _ in texts]
+
+    monkeypatch.setattr(ai.Window, "topics", topics)
+    monkeypatch.setattr(ai.Window, "podclip", podclip)
+    monkeypatch.setattr(ai, "embed", embed)
+    checkpoints = MemoryCheckpoints()
+
+    first = await ai.transcript_to_podclips(transcript, checkpoints)
+    assert len(first) == 2
+    assert calls[-1] == "embed 2"  # A single batch for the whole episode
+    assert sorted(checkpoints.saved) == [
+        "podclips/0",
+        "podclips/1",
+        "topics/0",
+        "topics/1",
+    ]
+
+    # A retry only redoes the excerpt calls of the window which did not complete.
+    del checkpoints.saved["podclips/1"]
+    calls.clear()
+    assert await ai.transcript_to_podclips(transcript, checkpoints) == first
+    assert calls == ["podclip", "embed 2"]
+
+
+def test_stream_windows_yields_windows_once_their_context_is_complete():
+    transcript = Transcript.from_segments(
+        Segment(start_time=i, end_time=i + 1, text=f"line {i}") for i in range(330)
+    )
+    received = []
+
+    def chunks():
+        for i in range(0, len(transcript), 110):
+            received.append(i)
+            yield transcript[i : i + 110]
+
+    windows = []
+    for window in ai.stream_windows(chunks()):
+        windows.append((len(received), window))
+
+    # The first window is complete once 125 lines arrived, before the last chunk.
+    assert windows[0][0] == 2
+    expected = ai.transcript_to_windows(transcript)
+    assert [(w.text(), w.text(context=True)) for _, w in windows] == [
+        (w.text(), w.text(context=True)) for w in expected
+    ]
+    assert windows[1][1].text() == " ".join(f"line {i}" for i in range(100, 200))
+    assert windows[1][1].text(context=True) == " ".join(
+        f"line {i}" for i in range(75, 225)
+    )
+
+
+@pytest.mark.asyncio
+async def test_excerpts_of_every_window_and_topic_run_at_once(monkeypatch):
+    transcript = Transcript.from_segments(
+        Segment(start_time=i * 10.0, end_time=i * 10.0 + 10, text=f"line {i}")
+        for i in range(300)
+    )
+    in_flight, peak = 0, 0
+
+    async def topics(window):
+        return [ai.Topic(f"Topic {i}", "Description") for i in range(3)]
+
+    async def podclip(window, topic):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return None
+
+    monkeypatch.setattr(ai.Window, "topics", topics)
+    monkeypatch.setattr(ai.Window, "podclip", podclip)
+
+    assert await ai.transcript_to_podclips(transcript) == []
+    assert peak == 3 * 3  # Three topics of each of the three windows
+
+
+@pytest.mark.asyncio
+async def test_single_call_mode_extracts_topics_and_excerpts_at_once(monkeypatch):
+    transcript = Transcript.from_segments(
+        Segment(start_time=i * 10.0, end_time=i * 10.0 + 10, text=f"line {i}")
+        for i in range(150)
+    )
+    window = ai.transcript_to_windows(transcript)[1]
+    requests = []
+
+    content = json.dumps(
+        {
+            "podclips": [
+                {"title": "A", "description": "About A", "start": 0, "end": 9},
+                {"title": "B", "description": "About B", "start": 5, "end": 10},
+                {"title": "C", "description": "Off", "start": 40, "end": 99},
+            ]
+        }
+    )
+
+    async def complete(parse, **kwargs):
+        requests.append(kwargs)
+        return parse(content)
+
+    monkeypatch.setattr(config, "EXTRACTION_MODE", "single_call")
+    monkeypatch.setattr(ai, "complete", complete)
+
+    podclips = await ai.window_podclips(window, 1)
+    assert len(requests) == 1
+    assert requests[0]["response_format"]["type"] == "json_schema"
+    assert "Lines 25 to 74" in requests[0]["messages"][1]["content"]
+    # B is too short and C is out of range, so only A is a podclip.
+    assert [(p.title, p.start_time, p.end_time) for p in podclips] == [
+        ("A", 750.0, 850.0)
+    ]
+
+
+def test_dedup_keeps_the_longest_of_overlapping_similar_podclips():
+    def podclip(title, start, end, embedding):
+        return ai.Podclip(title, "", start, end, "", embedding)
+
+    podclips = [
+        podclip("First window", 100.0, 400.0, [1.0, 0.0]),
+        podclip("Second window", 90.0, 420.0, [0.99, 0.1]),  # Same topic, longer
+        podclip("Other topic", 100.0, 400.0, [0.0, 1.0]),  # Same time, other topic
+        podclip("Later", 900.0, 1200.0, [1.0, 0.0]),  # Same topic, other time
+    ]
+    kept = ai.dedup_podclips(podclips)
+    assert [p.title for p in kept] == ["Second window", "Other topic", "Later"]
+
+
+def test_windows_from_parts_of_a_transcript_match_the_whole():
+    transcript = Transcript.from_segments(
+        Segment(start_time=i, end_time=i + 1, text=f"line {i}") for i in range(437)
+    )
+    windows = ai.transcript_to_windows(transcript)
+
+    assert ai.complete_windows(124, finished=False) == 0
+    assert ai.complete_windows(125, finished=False) == 1
+    assert ai.complete_windows(437, finished=False) == 4
+    assert ai.complete_windows(437, finished=True) == len(windows) == 5
+    for index, window in enumerate(windows):
+        lines = ai.window_lines(index)
+        start = max(0, lines.start - 7)  # Parts may start before the context
+        part = transcript[start : lines.stop + 3]
+        from_part = ai.window_at(part, index, start)
+        assert list(from_part.context.lines()) == list(window.context.lines())
+        assert (from_part.first, from_part.last) == (window.first, window.last)
@@ -0,0 +1,166 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from octopod.ai import embeddings, responses
+from octopod.config import config
+from octopod.metrics import measure
+
+
+@pytest.fixture(autouse=True)
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "LLM_CACHE_BACKEND", "disk")
+    monkeypatch.setattr(responses, "async_openai_client", MagicMock)
+
+
+def completion(content: str, finish_reason: str = "stop") -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "completion",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": finish_reason,
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_completed_once(monkeypatch):
+    requests = []
+
+    async def limited_async(create, tokens=0, **request):
+        requests.append(request)
+        return completion(f"answer {len(requests)}")
+
+    monkeypatch.setattr(responses, "limited_async", limited_async)
+    messages = [{"role": "user", "content": "Find the topics"}]
+
+    with measure("extract") as metrics:
+        first = await responses.complete(str, model="gpt-4o-mini", messages=messages)
+        again = await responses.complete(str, model="gpt-4o-mini", messages=messages)
+        other = await responses.complete(
+            str,
+            model="gpt-4o-mini",
+            messages=messages,
+            response_format={"type": "json_object"},
+        )
+
+    assert (first, again, other) == ("answer 1", "answer 1", "answer 2")
+    assert len(requests) == 2
+    assert (metrics.cache_hits, metrics.cache_misses) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_truncated_completions_are_not_cached(monkeypatch):
+    async def limited_async(create, tokens=0, **request):
+        return completion('{"topics": [', finish_reason="length")
+
+    monkeypatch.setattr(responses, "limited_async", limited_async)
+    await responses.complete(str, model="gpt-4o-mini", messages=[])
+    assert (
+        responses.response_cache().get(  # type: ignore
+            responses.request_key("chat", model="gpt-4o-mini", messages=[])
+        )
+        is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_malformed_completions_are_not_served_again(monkeypatch):
+    replies = ['{"topic": []}', '{"topics": ["A"]}']
+    requests = []
+
+    async def limited_async(create, tokens=0, **request):
+        requests.append(request)
+        return completion(replies[len(requests) - 1])
+
+    def parse(content):
+        try:
+            return json.loads(content)["topics"]
+        except KeyError:
+            raise ValueError("Failed to parse topics from response")
+
+    monkeypatch.setattr(responses, "limited_async", limited_async)
+    with pytest.raises(ValueError):
+        await responses.complete(parse, model="gpt-4o-mini", messages=[])
+    assert await responses.complete(parse, model="gpt-4o-mini", messages=[]) == ["A"]
+    assert await responses.complete(parse, model="gpt-4o-mini", messages=[]) == ["A"]
+    assert len(requests) == 2
+
+    # A malformed completion which was cached before is requested again.
+    key = responses.request_key("chat", model="gpt-4o-mini", messages=[])
+    responses.DiskResponseCache().put(
+        key, completion('{"topic": []}').model_dump_json().encode()
+    )
+    replies.append('{"topics": ["B"]}')
+    assert await responses.complete(parse, model="gpt-4o-mini", messages=[]) == ["B"]
+    assert len(requests) == 3
+
+
+def test_disk_entries_expire(monkeypatch):
+    cache = responses.DiskResponseCache()
+    cache.put("key", b"response")
+    assert cache.get("key") == b"response"
+
+    monkeypatch.setattr(config, "LLM_CACHE_TTL", -1)
+    cache.put("key", b"response")
+    assert cache.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_only_uncached_texts_are_embedded(monkeypatch):
+    requests = []
+
+    async def limited_async(create, tokens=0, **request):
+        assert request["dimensions"] == embeddings.EMBEDDING_DIMENSIONS
+        requests.append(request["input"])
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=[float(len(text)), 0.5])
+                for i, text in enumerate(request["input"])
+            ]
+        )
+
+    monkeypatch.setattr(embeddings, "limited_async", limited_async)
+    monkeypatch.setattr(
+        embeddings,
+        "async_openai_client",
+        lambda: SimpleNamespace(
+            embeddings=SimpleNamespace(with_raw_response=SimpleNamespace(create=None))
+        ),
+    )
+
+    assert await embeddings.embed(["a", "bb"]) == [[1.0, 0.5], [2.0, 0.5]]
+    with measure("embed") as metrics:
+        assert await embeddings.embed(["bb", "ccc", "a"]) == [
+            [2.0, 0.5],
+            [3.0, 0.5],
+            [1.0, 0.5],
+        ]
+    assert requests == [["a", "bb"], ["ccc"]]
+    assert (metrics.cache_hits, metrics.cache_misses) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_do_not_fail_requests(monkeypatch):
+    async def limited_async(create, tokens=0, **request):
+        return completion("answer")
+
+    def broken(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(responses, "limited_async", limited_async)
+    monkeypatch.setattr(responses.DiskCache, "read", broken)
+    monkeypatch.setattr(responses.DiskCache, "put", broken)
+    assert await responses.complete(str, model="gpt-4o-mini", messages=[]) == "answer"
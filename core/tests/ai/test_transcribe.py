@@ -0,0 +1,102 @@
+import importlib
+
+import octopod.ai.transcribe as transcribe_module
+from octopod.ai.transcribe import (
+    MAX_CHUNK_SECONDS,
+    MIN_CHUNK_SECONDS,
+    Segment,
+    chunk_count,
+    plan_chunks,
+    transcribe,
+)
+from octopod.audio import AudioSource
+from octopod.config import config
+
+
+def test_chunks_fit_the_upload_limit_and_the_parallelism(monkeypatch):
+    monkeypatch.setattr(config, "TRANSCRIBE_PARALLELISM", 8)
+    assert chunk_count(60) == 1
+    assert chunk_count(10 * 60) == 5  # Limited by the minimum length
+    assert chunk_count(60 * 60) == 8  # Limited by the parallelism
+    assert 10 * 60 * 60 / chunk_count(10 * 60 * 60) <= MAX_CHUNK_SECONDS
+    assert 10 * 60 * 60 / chunk_count(10 * 60 * 60) >= MIN_CHUNK_SECONDS
+
+
+def test_chunks_end_in_pauses(monkeypatch):
+    source = AudioSource(
+        path="episode.mp3", duration=3600.0, frame_rate=44100, channels=2
+    )
+    monkeypatch.setattr(config, "TRANSCRIBE_PARALLELISM", 4)
+    monkeypatch.setattr(source, "quietest", lambda start, end: start + 3.0)
+
+    chunks = plan_chunks(source)
+    assert chunks[0] == (0.0, 893.0)
+    assert chunks[1] == (893.0, 1793.0)
+    assert chunks[-1][1] == 3600.0
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert len(chunks) == 4
+
+
+def test_transcribes_every_chunk_from_its_own_buffer(monkeypatch):
+    source = AudioSource(
+        path="episode.mp3", duration=3600.0, frame_rate=44100, channels=2
+    )
+    monkeypatch.setattr(config, "TRANSCRIBE_PARALLELISM", 4)
+    monkeypatch.setattr(source, "quietest", lambda start, end: (start + end) / 2)
+    monkeypatch.setattr(
+        source, "encode_speech", lambda start, duration: f"{start}".encode()
+    )
+    uploads = []
+
+    def fake_transcribe(audio, offset_secs):
+        uploads.append(audio)
+        return [Segment(start_time=offset_secs, end_time=offset_secs, text="")]
+
+    monkeypatch.setattr(transcribe_module, "_transcribe", fake_transcribe)
+
+    transcript = transcribe(source)
+    assert transcript.starts.tolist() == [0, 900, 1800, 2700]
+    assert sorted(uploads) == [b"0.0", b"1800.0", b"2700.0", b"900.0"]
+
+
+def test_dispatches_to_the_configured_backend(monkeypatch):
+    source = AudioSource(
+        path="episode.mp3", duration=3600.0, frame_rate=44100, channels=2
+    )
+    monkeypatch.setattr(config, "TRANSCRIPTION_BACKEND", "local")
+    monkeypatch.setattr(config, "TRANSCRIBE_PARALLELISM", 2)
+    monkeypatch.setattr(source, "quietest", lambda start, end: (start + end) / 2)
+    local_whisper = importlib.import_module("octopod.ai.local_whisper")
+    monkeypatch.setattr(
+        local_whisper,
+        "_transcribe",
+        lambda source, chunk: [
+            Segment(start_time=chunk[0], end_time=chunk[1], text="")
+        ],
+    )
+
+    assert isinstance(transcribe_module.backend(), local_whisper.LocalWhisperBackend)
+    transcript = transcribe(source)
+    assert transcript.starts.tolist() == [0, 1800]
+    assert transcript.ends.tolist() == [1800, 3600]
+
+
+def test_stream_yields_chunks_in_order_as_they_finish(monkeypatch):
+    source = AudioSource(
+        path="episode.mp3", duration=3600.0, frame_rate=44100, channels=2
+    )
+    monkeypatch.setattr(config, "TRANSCRIBE_PARALLELISM", 3)
+    monkeypatch.setattr(source, "quietest", lambda start, end: (start + end) / 2)
+
+    class OutOfOrderBackend(transcribe_module.TranscriptionBackend):
+        def transcribe(self, source, chunks):
+            for i in sorted(chunks, reverse=True):
+                start, end = chunks[i]
+                yield i, [Segment(start_time=start, end_time=end, text=str(i))]
+
+    monkeypatch.setattr(transcribe_module, "backend", OutOfOrderBackend)
+
+    texts = [
+        list(chunk.lines()) for chunk in transcribe_module.transcribe_stream(source)
+    ]
+    assert texts == [["0"], ["1"], ["2"]]
@@ -0,0 +1,43 @@
+from octopod.ai.transcript import Segment, Transcript
+
+
+def segments(count, offset=0):
+    return [
+        Segment(start_time=i * 2.0, end_time=i * 2.0 + 1.5, text=f" line {i} é")
+        for i in range(offset, offset + count)
+    ]
+
+
+def test_slices_are_views_of_the_transcript():
+    transcript = Transcript.from_segments(segments(10))
+    window = transcript[3:6]
+
+    assert window.starts.base is transcript.starts
+    assert window.text is transcript.text
+    assert window.segments() == segments(10)[3:6]
+    assert window.joined() == " ".join(s.text for s in segments(10)[3:6])
+    assert transcript[8:20].segments() == segments(10)[8:]
+    assert len(transcript[6:3]) == 0
+
+
+def test_finds_lines_by_time():
+    transcript = Transcript.from_segments(segments(10))
+
+    assert transcript.line_at(0.0) == 0
+    assert transcript.line_at(7.9) == 3
+    assert transcript.line_at(8.0) == 4
+    assert transcript.line_at(100.0) == 9
+    # Line 3 ends at 7.5, line 5 starts at 10.
+    assert transcript.between(7.6, 10.0).segments() == segments(10)[4:5]
+
+
+def test_concatenates_and_round_trips_through_bytes():
+    parts = [Transcript.from_segments(segments(4)), Transcript.from_segments([])]
+    parts.append(Transcript.from_segments(segments(6, offset=4))[1:])
+    transcript = Transcript.concat(parts)
+    expected = segments(4) + segments(6, offset=4)[1:]
+    assert transcript.segments() == expected
+
+    decoded = Transcript.from_bytes(transcript[2:7].to_bytes())
+    assert decoded.segments() == expected[2:7]
+    assert Transcript.from_bytes(Transcript.concat([]).to_bytes()).segments() == []
@@ -0,0 +1,16 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from octopod import storage
+from octopod.config import config
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        storage.s3_client.cache_clear()
+        boto3.client("s3").create_bucket(Bucket=config.AWS_S3_BUCKET)
+        yield boto3.client("s3")
+    storage.s3_client.cache_clear()
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from octopod import audio
+from octopod.audio import ANALYSIS_RATE, AudioSource
+from octopod.metrics import measure
+
+
+def test_slice_decodes_only_requested_range(monkeypatch):
+    source = AudioSource(
+        path="episode.mp3", duration=60.0, frame_rate=44100, channels=2
+    )
+    calls = []
+    monkeypatch.setattr(
+        source, "decode", lambda start, duration: calls.append((start, duration))
+    )
+
+    assert len(source) == 60000
+    source[5000:10000]
+    source[55000:70000]
+    source[:1000]
+    assert calls == [(5.0, 5.0), (55.0, 5.0), (0.0, 1.0)]
+
+
+def test_quietest_finds_the_pause_between_words(monkeypatch):
+    source = AudioSource(
+        path="episode.mp3", duration=60.0, frame_rate=44100, channels=2
+    )
+    rng = np.random.default_rng(0)
+    speech = rng.integers(-8000, 8000, size=20 * ANALYSIS_RATE, dtype=np.int16)
+    speech[int(12.5 * ANALYSIS_RATE) : int(13 * ANALYSIS_RATE)] //= 100  # A pause
+    speech[int(4 * ANALYSIS_RATE)] = 0  # A single quiet sample is not a pause
+    monkeypatch.setattr(source, "samples", lambda start, duration: speech)
+
+    assert abs(source.quietest(20.0, 40.0) - 32.75) < 0.05
+
+
+def test_only_audio_read_from_urls_counts_as_downloaded(monkeypatch):
+    monkeypatch.setattr(
+        audio.subprocess, "run", lambda *args, **kwargs: SimpleNamespace(stdout=b"")
+    )
+    local = AudioSource("episode.mp3", 60.0, 44100, 2, bit_rate=128_000)
+    remote = AudioSource("https://example.com/episode.mp3", 60.0, 44100, 2, 128_000)
+
+    with measure("transcribe") as metrics:
+        local.encode_speech(0.0, 10.0)
+        local.decode(0.0, 10.0)
+    assert metrics.bytes_downloaded == 0
+
+    with measure("transcribe") as metrics:
+        remote.encode_speech(0.0, 10.0)
+        remote.decode(0.0, 10.0)
+    assert metrics.bytes_downloaded == 2 * 160_000
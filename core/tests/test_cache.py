@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from octopod.cache import EVICT_FRACTION, DiskCache
+from octopod.config import config
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    cache = DiskCache("test", max_bytes=25)
+    for i, key in enumerate(["old", "mid", "new"]):
+        cache.put(key, b"x" * 10)
+        os.utime(cache.path(key), (i, i))
+
+    cache.evict()
+
+    assert cache.get("old") is None
+    assert cache.get("mid") is not None
+    assert cache.get("new") is not None
+
+
+def test_concurrent_puts_stay_within_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    cache = DiskCache("test", max_bytes=20 * 1024)
+
+    def put(thread):
+        for i in range(200):
+            cache.put(f"{i % 50}", bytes([thread]) * 1024)  # Shared keys too
+
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(put, range(16)))
+
+    names = os.listdir(cache.directory)
+    assert not [name for name in names if name.endswith(".tmp")]
+    size = sum(os.path.getsize(cache.path(name)) for name in names)
+    assert size <= 20 * 1024 * (1 + EVICT_FRACTION)
@@ -0,0 +1,127 @@
+import sys
+from typing import List, Optional
+
+import pytest
+import requests
+
+from octopod import checkpoint
+from octopod.checkpoint import SAMPLE_BYTES, SAMPLES, _iter_ranges, _sample_ranges
+from octopod.metrics import measure
+
+
+def test_streamed_samples_match_range_requests():
+    data = bytes(i % 251 for i in range(5 * SAMPLE_BYTES + 123))
+    ranges = _sample_ranges(len(data))
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data) - 1
+
+    chunks = [data[i : i + 100_000] for i in range(0, len(data), 100_000)]
+    expected = b"".join(data[start : end + 1] for start, end in ranges)
+    assert b"".join(_iter_ranges(chunks, ranges)) == expected
+
+
+def test_small_files_are_sampled_whole():
+    assert _sample_ranges(1000) == [(0, 999)]
+
+
+def test_files_of_unknown_size_are_hashed_as_they_stream():
+    def chunks():
+        for _ in range(3):
+            yield b"x" * 100_000
+
+    pieces = _iter_ranges(chunks(), [(0, sys.maxsize)])
+    assert next(pieces) == b"x" * 100_000  # Before the rest of the file was read
+    assert sum(len(piece) for piece in pieces) == 200_000
+
+
+class Response:
+    def __init__(
+        self, status_code: int, body: bytes = b"", headers: Optional[dict] = None
+    ):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.read = 0  # Bytes of the body which were streamed
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)  # type: ignore
+
+    def iter_content(self, chunk_size: int):
+        for i in range(0, len(self.body), chunk_size):
+            self.read += min(chunk_size, len(self.body) - i)
+            yield self.body[i : i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Server:
+    """Serves a file, with or without support for HEAD and range requests."""
+
+    def __init__(self, data: bytes, head: bool = True, ranges: bool = True):
+        self.data = data
+        self.head_allowed = head
+        self.ranges = ranges
+        self.gets: List[Response] = []
+
+    def head(self, url: str, allow_redirects: bool = False) -> Response:
+        if not self.head_allowed:
+            return Response(405)
+        headers = {"Content-Length": str(len(self.data))}
+        if self.ranges:
+            headers["Accept-Ranges"] = "bytes"
+        return Response(200, headers=headers)
+
+    def get(
+        self, url: str, headers: Optional[dict] = None, stream: bool = False
+    ) -> Response:
+        assert stream
+        if self.ranges and headers is not None:
+            start, end = map(int, headers["Range"].removeprefix("bytes=").split("-"))
+            response = Response(206, self.data[start : end + 1])
+        else:
+            response = Response(200, self.data, {"Content-Length": str(len(self.data))})
+        self.gets.append(response)
+        return response
+
+
+def server_hash(monkeypatch, server: Server) -> str:
+    monkeypatch.setattr(checkpoint.requests, "head", server.head)
+    monkeypatch.setattr(checkpoint.requests, "get", server.get)
+    return checkpoint.input_hash("https://example.com/episode.mp3")
+
+
+AUDIO = bytes(range(251)) * (20 * 1_048_576 // 251)
+
+
+@pytest.mark.parametrize("head, ranges", [(True, False), (False, True), (False, False)])
+def test_hash_of_audio_does_not_depend_on_the_server(monkeypatch, head, ranges):
+    ranged = Server(AUDIO)
+    expected = server_hash(monkeypatch, ranged)
+    assert sum(response.read for response in ranged.gets) == SAMPLES * SAMPLE_BYTES
+
+    server = Server(AUDIO, head=head, ranges=ranges)
+    with measure("probe") as metrics:
+        assert server_hash(monkeypatch, server) == expected
+    # The file is streamed once, up to its last sample, which ends with the file.
+    assert len(server.gets) == 1
+    assert metrics.bytes_downloaded == len(AUDIO)
+
+
+def test_samples_are_taken_from_the_first_response_which_ignores_its_range(
+    monkeypatch,
+):
+    expected = server_hash(monkeypatch, Server(AUDIO))
+
+    server = Server(AUDIO)
+    get = server.get
+
+    def get_ignoring_ranges(url, headers=None, stream=False):
+        return get(url, None if server.gets else headers, stream)
+
+    monkeypatch.setattr(server, "get", get_ignoring_ranges)
+    assert server_hash(monkeypatch, server) == expected
+    assert [response.status_code for response in server.gets] == [206, 200]
@@ -0,0 +1,44 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pytest
+
+from octopod.metrics import count, measure
+
+
+def test_measure_counts_from_worker_threads():
+    started_at = datetime.now(timezone.utc)
+    with measure("render") as metrics:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(
+                executor.map(lambda n: count(bytes_uploaded=n, api_calls=1), range(10))
+            )
+    count(api_calls=1)  # Outside of any stage
+
+    assert metrics.bytes_uploaded == 45
+    assert metrics.api_calls == 10
+    assert metrics.started_at >= started_at
+    assert metrics.wall_seconds > 0
+    assert metrics.peak_rss_bytes > 0
+    assert metrics.error is None
+
+
+def test_measure_records_errors():
+    with pytest.raises(ValueError):
+        with measure("extract") as metrics:
+            raise ValueError("Failed to parse topics")
+    assert metrics.error == "ValueError('Failed to parse topics')"
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/clear_refs"), reason="Needs Linux /proc"
+)
+def test_peak_rss_is_measured_per_stage():
+    with measure("decode") as large:
+        buffer = bytearray(128 * 1024 * 1024)
+        buffer[::4096] = b"x" * len(buffer[::4096])  # Touch every page
+        del buffer
+    with measure("save") as small:
+        pass
+    assert small.peak_rss_bytes < large.peak_rss_bytes - 64 * 1024 * 1024
@@ -0,0 +1,37 @@
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+from octopod import queue
+from octopod.queue import (
+    SIZE_CLASSES,
+    Tier,
+    podcast_tier,
+    queue_classes,
+    worker_queues,
+)
+
+
+def test_back_catalog_episodes_are_backfilled():
+    now = datetime.now(timezone.utc)
+    assert podcast_tier(None) == Tier.Interactive
+    assert podcast_tier(now - timedelta(days=2)) == Tier.Interactive
+    assert podcast_tier(now - timedelta(days=400)) == Tier.Backfill
+    assert podcast_tier(datetime(2001, 1, 1)) == Tier.Backfill
+
+
+def test_workers_take_the_size_classes_they_fit():
+    small = [queue.name for queue in worker_queues(1024)]
+    assert small == ["interactive-small", "reprocess-small", "backfill-small"]
+
+    large = [queue.name for queue in worker_queues(8192)]
+    assert large[:3] == ["interactive-large", "interactive-medium", "interactive-small"]
+    assert len(large) == 9
+    assert queue_classes("backfill-medium") == (Tier.Backfill, SIZE_CLASSES[1])
+
+
+def test_size_class_falls_back_to_the_largest_when_probing_stalls(monkeypatch):
+    def probe(path, timeout):
+        raise subprocess.TimeoutExpired(["ffprobe", path], timeout)
+
+    monkeypatch.setattr(queue.AudioSource, "probe", probe)
+    assert queue.size_class("https://example.com/episode.mp3") == queue.SIZE_CLASSES[-1]
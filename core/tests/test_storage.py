@@ -0,0 +1,27 @@
+from boto3.s3.transfer import TransferConfig
+
+from octopod import storage
+from octopod.config import config
+
+MB = 1024 * 1024
+
+
+def test_uploads_large_objects_in_parts(bucket, monkeypatch):
+    monkeypatch.setattr(
+        storage,
+        "TRANSFER_CONFIG",
+        TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB),
+    )
+    data = bytes(range(256)) * (11 * MB // 256)
+
+    with storage.Uploader() as uploader:
+        small = uploader.upload(b"small", "small.mp3", "audio/mpeg")
+        large = uploader.upload(data, "large.mp3")
+
+    assert small.result().endswith("/small.mp3")
+    assert large.result().endswith("/large.mp3")
+    head = bucket.head_object(Bucket=config.AWS_S3_BUCKET, Key="large.mp3")
+    assert head["ETag"].endswith('-3"')  # Multipart upload of three parts
+    response = bucket.get_object(Bucket=config.AWS_S3_BUCKET, Key="small.mp3")
+    assert response["Body"].read() == b"small"
+    assert response["ContentType"] == "audio/mpeg"
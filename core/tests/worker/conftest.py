@@ -0,0 +1,48 @@
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from octopod.models import Base, Creator, Podcast, PodcastStatus, Podclip
+from octopod.worker import tasks
+
+
+@pytest_asyncio.fixture
+async def session_maker(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(tasks, "SessionLocal", session_maker)
+    yield session_maker
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def podclip(session_maker) -> Podclip:
+    """A podclip of a podcast which is being processed, of its creator."""
+    async with session_maker() as session:
+        creator = Creator(name="Creator", email="creator@example.com", uma_address="")
+        session.add(creator)
+        await session.flush()
+        podcast = Podcast(
+            creator_id=creator.id,
+            title="Episode",
+            description="",
+            duration=600.0,
+            audio_url="https://example.com/episode.mp3",
+            status=PodcastStatus.Processing,
+        )
+        session.add(podcast)
+        await session.flush()
+        podclip = Podclip(
+            podcast_id=podcast.id,
+            title="Old title",
+            description="",
+            audio_url="https://example.com/old.mp3",
+            duration=60,
+            start_time=0.0,
+            end_time=60.0,
+            embedding=[0.0] * 1536,
+        )
+        session.add(podclip)
+        await session.commit()
+    return podclip
@@ -0,0 +1,20 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from octopod.config import config
+from octopod.worker import background
+
+
+def test_concurrent_listings_share_the_cached_index(bucket, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "BACKGROUND_LISTING_TTL", -1)  # Always refresh
+    for name in ("a.mp3", "b.mp3", "notes.txt"):
+        bucket.put_object(Bucket=config.AWS_S3_BUCKET, Key=f"background/{name}")
+
+    with ThreadPoolExecutor(4) as executor:
+        listings = list(executor.map(lambda _: background.list_tracks(), range(40)))
+
+    assert all(
+        sorted(songs) == ["background/a.mp3", "background/b.mp3"] for songs in listings
+    )
+    assert os.listdir(tmp_path) == ["background.json"]
@@ -0,0 +1,193 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List
+from uuid import uuid4
+
+import fakeredis
+import pytest
+from pydub import AudioSegment  # type: ignore
+from rq import Queue
+from sqlalchemy import select
+
+from octopod import queue
+from octopod.ai.transcript import Segment, Transcript, require_transcript
+from octopod.checkpoint import Checkpoints
+from octopod.models import Podclip, ProcessingStage
+from octopod.worker import pipeline, tasks
+
+AUDIO_URL = "https://example.com/episode.mp3"
+DIGEST = "digest"
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(queue, "redis", server)
+    monkeypatch.setattr(pipeline, "redis", server)
+    monkeypatch.setattr(
+        pipeline, "EXTRACTED", server.register_script(pipeline.EXTRACTED.script)
+    )
+    return server
+
+
+@pytest.fixture
+def run(monkeypatch, fake_redis):
+    """The current job, of a run of a medium sized podcast in the interactive tier."""
+    meta = {"run_id": "run", "queue": "interactive-medium"}
+    job = SimpleNamespace(id="run", origin="interactive-medium", meta=meta)
+    monkeypatch.setattr(pipeline, "get_current_job", lambda: job)
+    return job
+
+
+def queued(fake_redis, name: str, func_name: str) -> list:
+    jobs = Queue(name, connection=fake_redis).jobs
+    return [job for job in jobs if job.func_name == f"{pipeline.__name__}.{func_name}"]
+
+
+def chunk_segments(index: int, lines: int) -> List[Segment]:
+    return [
+        Segment(start_time=i, end_time=i + 1, text=f"Line {index}.{i}")
+        for i in range(lines)
+    ]
+
+
+def transcribe(checkpoints: Checkpoints, index: int, lines: int):
+    """Checkpoint a chunk of the transcript, as `transcribe_chunk` does."""
+    checkpoints.save(
+        f"transcript/{index}",
+        [segment.model_dump() for segment in chunk_segments(index, lines)],
+    )
+    pipeline._record_lines({index: lines})
+
+
+def test_fan_out_joins_in_the_size_class_of_the_run(run, fake_redis):
+    podcast_id = uuid4()
+    join = pipeline._fan_out(
+        pipeline.transcribe_chunk,
+        [(podcast_id, DIGEST, AUDIO_URL, i) for i in range(3)],
+        pipeline.plan_extraction,
+        (podcast_id, DIGEST, AUDIO_URL, 3),
+    )
+
+    chunks = queued(fake_redis, "interactive-small", "transcribe_chunk")
+    assert [job.args[-1] for job in chunks] == [0, 1, 2]
+    assert all(job.meta == run.meta for job in chunks)
+    assert join.origin == "interactive-medium"
+    assert join.meta == run.meta
+    assert sorted(join._dependency_ids) == sorted(job.id for job in chunks)
+    assert join.get_status() == "deferred"
+
+
+def test_windows_are_enqueued_as_the_transcript_prefix_grows(run, fake_redis, bucket):
+    podcast_id = uuid4()
+    checkpoints = Checkpoints(podcast_id, DIGEST)
+
+    def windows():
+        return queued(fake_redis, "interactive-small", "extract_window")
+
+    transcribe(checkpoints, 1, 120)
+    pipeline._enqueue_windows(podcast_id, DIGEST, AUDIO_URL, 3)
+    assert windows() == []  # The first chunk is not transcribed yet
+
+    transcribe(checkpoints, 0, 120)
+    pipeline._enqueue_windows(podcast_id, DIGEST, AUDIO_URL, 3)
+    assert [job.args[3] for job in windows()] == [0, 1]
+
+    transcribe(checkpoints, 2, 120)
+    pipeline._enqueue_windows(podcast_id, DIGEST, AUDIO_URL, 3)
+    pipeline._enqueue_windows(podcast_id, DIGEST, AUDIO_URL, 3)  # By plan_extraction
+    assert [job.args[3] for job in windows()] == [0, 1, 2, 3]
+    assert queued(fake_redis, "interactive-medium", "plan_renders") == []
+
+    transcript = Transcript.from_segments(
+        segment for i in range(3) for segment in chunk_segments(i, 120)
+    )
+    window = windows()[1]
+    context = require_transcript(checkpoints, "windows/1")
+    assert list(context.lines()) == list(transcript[75:225].lines())
+    assert window.args[4:] == (25, 125)
+
+
+def test_renders_are_planned_once_every_window_is_extracted(run, fake_redis):
+    podcast_id = uuid4()
+    state = pipeline._run_key("extraction")
+
+    # Windows may be extracted before the last of them is even enqueued.
+    pipeline._join_windows(podcast_id, DIGEST, AUDIO_URL, 0)
+    pipeline._join_windows(podcast_id, DIGEST, AUDIO_URL, 1)
+    fake_redis.hset(state, mapping={"enqueued": 4, "total": 4})
+    pipeline._join_windows(podcast_id, DIGEST, AUDIO_URL, None)
+    assert queued(fake_redis, "interactive-medium", "plan_renders") == []
+
+    # The last windows finish at once, and one of them is retried.
+    with ThreadPoolExecutor(4) as executor:
+        list(
+            executor.map(
+                lambda index: pipeline._join_windows(
+                    podcast_id, DIGEST, AUDIO_URL, index
+                ),
+                [2, 3, 3, 1] * 5,
+            )
+        )
+    pipeline._join_windows(podcast_id, DIGEST, AUDIO_URL, None)
+
+    (plan,) = queued(fake_redis, "interactive-medium", "plan_renders")
+    assert plan.args == (podcast_id, DIGEST, AUDIO_URL, 4)
+    assert plan.meta == run.meta
+
+
+@pytest.fixture
+def rendering(monkeypatch):
+    """Render podclips without speech or audio."""
+
+    async def get_creator_name(podcast_id):
+        return "Creator"
+
+    monkeypatch.setattr(pipeline, "get_creator_name", get_creator_name)
+    monkeypatch.setattr(
+        pipeline, "title_intro", lambda title, creator: AudioSegment.silent(1000)
+    )
+    monkeypatch.setattr(pipeline.AudioSource, "probe", lambda path: path)
+
+
+@pytest.mark.asyncio
+async def test_rerender_podclip_points_it_at_new_audio(
+    session_maker, podclip, rendering, monkeypatch
+):
+    renders = []
+
+    def render_podclip(source, job):
+        renders.append((source, job.start_time, job.end_time))
+        return "https://example.com/new.mp3"
+
+    monkeypatch.setattr(pipeline, "render_podclip", render_podclip)
+    await pipeline.rerender_podclip(podclip.podcast_id, podclip.id)
+
+    assert renders == [(AUDIO_URL, 0.0, 60.0)]
+    assert (
+        await tasks.get_podclip(podclip.id)
+    ).audio_url == "https://example.com/new.mp3"
+    async with session_maker() as session:
+        stages = (await session.scalars(select(ProcessingStage))).all()
+    assert [stage.stage for stage in stages] == ["rerender_podclip"]
+
+
+@pytest.mark.asyncio
+async def test_rerender_podclip_drops_audio_of_outdated_edits(
+    session_maker, podclip, rendering, monkeypatch
+):
+    async def set_podclip_audio(rendered, audio_url):
+        async with session_maker() as session:  # The podclip is edited while rendering
+            edited = await session.get(Podclip, podclip.id)
+            assert edited is not None
+            edited.title = "New title"
+            await session.commit()
+        return await tasks.set_podclip_audio(rendered, audio_url)
+
+    monkeypatch.setattr(
+        pipeline, "render_podclip", lambda source, job: "https://example.com/stale.mp3"
+    )
+    monkeypatch.setattr(pipeline, "set_podclip_audio", set_podclip_audio)
+    await pipeline.rerender_podclip(podclip.podcast_id, podclip.id)
+
+    assert (await tasks.get_podclip(podclip.id)).audio_url == podclip.audio_url
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import select
+
+from octopod.ai.podclip import Podclip as ExtractedPodclip
+from octopod.models import Podcast, PodcastStatus, Podclip
+from octopod.worker import tasks
+
+
+@pytest.mark.asyncio
+async def test_save_podclips_replaces_clips_and_marks_ready(session_maker, podclip):
+    extracted = [
+        ExtractedPodclip(f"Clip {i}", "", i * 100.0, i * 100.0 + 90, "", [0.0] * 1536)
+        for i in range(3)
+    ]
+    urls = [f"https://example.com/{i}.mp3" for i in range(3)]
+    ids = await tasks.save_podclips(podclip.podcast_id, extracted, urls)
+
+    async with session_maker() as session:
+        podclips = (await session.scalars(select(Podclip))).all()
+        assert sorted(ids) == sorted(clip.id for clip in podclips)
+        assert sorted(clip.title for clip in podclips) == [
+            "Clip 0",
+            "Clip 1",
+            "Clip 2",
+        ]
+        saved = await session.get(Podcast, podclip.podcast_id)
+        assert saved is not None and saved.status == PodcastStatus.Ready
+
+
+@pytest.mark.asyncio
+async def test_set_podclip_audio_drops_outdated_renders(session_maker, podclip):
+    rendered = await tasks.get_podclip(podclip.id)
+    async with session_maker() as session:
+        edited = await session.get(Podclip, podclip.id)
+        assert edited is not None
+        edited.title = "New title"
+        await session.commit()
+
+    assert not await tasks.set_podclip_audio(rendered, "https://example.com/stale.mp3")
+    current = await tasks.get_podclip(podclip.id)
+    assert await tasks.set_podclip_audio(current, "https://example.com/new.mp3")
+    assert (
+        await tasks.get_podclip(podclip.id)
+    ).audio_url == "https://example.com/new.mp3"